@@ -0,0 +1,332 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+#
+# Offline benchmark of yahoo_fs. Recorded Yahoo Finance pages are served from
+# a fixture directory through a local HTTP stand-in, so the numbers measure
+# the library and not the network.
+#
+#   python benchmark.py --output before.json
+#   python benchmark.py --output after.json --compare before.json
+#
+# Fixtures are stored as <fixtures>/<TICKER>/<page>.html, where page is one of
+# summary, statistics, profile, analysts, holdings, performance, risk or
+# history, and the chart data of the chart history backend is stored as
+# <fixtures>/<TICKER>/chart.json. The history and chart fixtures are served
+# for every requested period.
+
+import os
+import sys
+import json
+import gzip
+import zlib
+import hashlib
+import time
+import argparse
+import platform
+import threading
+import subprocess
+from statistics import median
+
+try:
+    from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+except ImportError:
+    sys.exit('benchmark.py requires Python 3.7 or newer')
+
+import yahoo_fs
+
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+# Url path segment of each page, the summary page has none
+PAGE_PATHS = {
+    'key-statistics': 'statistics',
+    'profile': 'profile',
+    'analysts': 'analysts',
+    'holdings': 'holdings',
+    'performance': 'performance',
+    'risk': 'risk',
+    'history': 'history',
+}
+
+QUOTES = (('GOOG', yahoo_fs.Share), ('SPY', yahoo_fs.ETF))
+
+# Getters which take arguments are benchmarked separately, once per history
+# backend
+HISTORY_CALLS = (
+    ('get_historical_day', ('2018-03-20',)),
+    ('get_historical_days', ('2018-01-02', '2018-03-20')),
+    ('get_historical_range', ('2017-01-01', '2018-01-01')),
+)
+HISTORY_BACKENDS = ('html', 'chart')
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        path = self.path.split('?')[0].strip('/').split('/')
+        page = 'summary' if len(path) == 2 else PAGE_PATHS.get(path[2])
+        fixture = os.path.join(self.server.fixtures, path[1], '%s.html' % page) if len(path) > 1 else ''
+        content_type = 'text/html; charset=utf-8'
+        if path[0] == 'chart':
+            fixture = os.path.join(self.server.fixtures, path[1], 'chart.json') if len(path) == 2 else ''
+            content_type = 'application/json;charset=utf-8'
+
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        if page == None or not os.path.isfile(fixture):
+            self.send_empty(404)
+            return
+
+        body = self.server.read(fixture)
+        etag = '"%s"' % hashlib.sha1(body).hexdigest()[:16]
+        if self.headers.get('If-None-Match') == etag:
+            self.send_empty(304, {'ETag': etag})
+            return
+
+        headers = {'Content-Type': content_type, 'ETag': etag}
+        encoding = self.server.encoding
+        if encoding and encoding in self.headers.get('Accept-Encoding', ''):
+            body = self.server.encode(fixture, body)
+            headers['Content-Encoding'] = encoding
+
+        self.server.statuses.append(200)
+        self.send_response(200)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_empty(self, status, headers=None):
+        self.server.statuses.append(status)
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FixtureServer(ThreadingHTTPServer):
+    """ Local stand-in for finance.yahoo.com serving the fixture pages, with
+        an ETag for conditional requests and, when encoding is 'gzip' or
+        'deflate', compressed bodies for clients accepting them. The status
+        of every response is appended to statuses.
+    """
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, fixtures, latency=0, encoding=None):
+        ThreadingHTTPServer.__init__(self, ('127.0.0.1', 0), FixtureHandler)
+        self.fixtures = fixtures
+        self.latency = latency
+        self.encoding = encoding
+        self.bodies = {}
+        self.statuses = []
+
+    def read(self, fixture):
+        if not fixture in self.bodies:
+            with open(fixture, 'rb') as f:
+                self.bodies[fixture] = f.read()
+        return self.bodies[fixture]
+
+    def encode(self, fixture, body):
+        key = (fixture, self.encoding)
+        if not key in self.bodies:
+            self.bodies[key] = gzip.compress(body) if self.encoding == 'gzip' else zlib.compress(body)
+        return self.bodies[key]
+
+    def start(self):
+        """ Method for serving in a background thread, returning the quote
+            url. The chart url is set as chart_url.
+        """
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        self.chart_url = 'http://127.0.0.1:%d/chart/' % self.server_address[1]
+        return 'http://127.0.0.1:%d/quote/' % self.server_address[1]
+
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    function(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def summarize(samples):
+    """ Method for reducing timings in seconds to milliseconds statistics.
+    """
+    return {
+        'min_ms': round(min(samples) * 1000, 4),
+        'median_ms': round(median(samples) * 1000, 4),
+        'mean_ms': round(sum(samples) / len(samples) * 1000, 4),
+        'runs': len(samples),
+    }
+
+
+def bench_parse(fixtures, repeat):
+    """ Method for timing the parse and index of every fixture page, and
+        the parse of the chart data.
+    """
+    results = {}
+    for ticker in sorted(os.listdir(fixtures)):
+        directory = os.path.join(fixtures, ticker)
+        if not os.path.isdir(directory):
+            continue
+        for name in sorted(os.listdir(directory)):
+            page = name.rsplit('.', 1)[0]
+            with open(os.path.join(directory, name), 'rb') as f:
+                content = f.read()
+
+            def parse():
+                if page == 'chart':
+                    return yahoo_fs.parse_chart_data(content, 0, sys.maxsize)
+                soup = yahoo_fs.make_soup(content, page)
+                yahoo_fs.PAGE_INDEXERS.get(page, yahoo_fs.index_soup)(soup)
+
+            result = summarize([timed(parse) for i in range(repeat)])
+            result['bytes'] = len(content)
+            results['%s/%s' % (ticker, page)] = result
+    return results
+
+
+def getter_names(quote_class):
+    skip = set(name for name, args in HISTORY_CALLS)
+    return [name for name in sorted(dir(quote_class)) if name.startswith('get_') and not name.startswith('get_custom_') and not name in skip]
+
+
+def bench_getters(repeat):
+    """ Method for timing every getter, cold on a new quote which has to
+        download and parse its page, and warm on a quote with loaded pages.
+    """
+    results = {}
+    for ticker, quote_class in QUOTES:
+        warm_quote = quote_class(ticker)
+        warm_quote.load()
+        for name in getter_names(quote_class):
+            cold = [timed(getattr(quote_class(ticker), name)) for i in range(repeat)]
+            warm = [timed(getattr(warm_quote, name)) for i in range(repeat)]
+            results['%s.%s' % (quote_class.__name__, name)] = {'cold': summarize(cold), 'warm': summarize(warm)}
+
+        for backend in HISTORY_BACKENDS:
+            for name, args in HISTORY_CALLS:
+                samples = [timed(getattr(warm_quote, name), *args, backend=backend) for i in range(repeat)]
+                key = '%s.%s' % (quote_class.__name__, name) if backend == 'html' else '%s.%s.%s' % (quote_class.__name__, name, backend)
+                results[key] = {'cold': summarize(samples)}
+    return results
+
+
+def bench_snapshot(repeat):
+    """ Method for timing a full to_dict snapshot, with and without the
+        page downloads.
+    """
+    results = {}
+    for ticker, quote_class in QUOTES:
+        loaded = quote_class(ticker)
+        loaded.load()
+        results[quote_class.__name__] = {
+            'cold': summarize([timed(quote_class(ticker).to_dict) for i in range(repeat)]),
+            'warm': summarize([timed(loaded.snapshot) for i in range(repeat)]),
+            'typed': summarize([timed(loaded.snapshot, typed=True) for i in range(repeat)]),
+        }
+    return results
+
+
+def bench_batch(size, workers):
+    """ Method for measuring fetch_many throughput in tickers per second.
+    """
+    results = {}
+    for ticker, quote_class in QUOTES:
+        kind = quote_class.__name__.lower()
+        seconds = timed(lambda: [result for result in yahoo_fs.fetch_many([ticker] * size, kind, max_workers=workers)])
+        results[kind] = {
+            'tickers': size,
+            'seconds': round(seconds, 4),
+            'tickers_per_second': round(size / seconds, 2),
+        }
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)), stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def flatten(results, prefix=''):
+    """ Method for listing every timing of a result tree as (name, ms).
+    """
+    timings = {}
+    for key, value in results.items():
+        name = prefix + '.' + key if prefix else key
+        if isinstance(value, dict) and 'median_ms' in value:
+            timings[name] = value['median_ms']
+        elif isinstance(value, dict):
+            timings.update(flatten(value, name))
+        elif key == 'tickers_per_second':
+            timings[name] = value
+    return timings
+
+
+def compare(results, baseline):
+    """ Method for printing the change of every timing against a baseline.
+    """
+    before = flatten(baseline['results'])
+    after = flatten(results['results'])
+    print('%-70s %12s %12s %8s' % ('benchmark', 'baseline', 'current', 'change'))
+    for name in sorted(after):
+        if not name in before or before[name] == 0:
+            continue
+        change = after[name] / before[name] - 1
+        print('%-70s %12.3f %12.3f %+7.1f%%' % (name, before[name], after[name], change * 100))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline yahoo_fs benchmark against recorded fixture pages.')
+    parser.add_argument('--fixtures', default=FIXTURES, help='directory of <TICKER>/<page>.html fixtures')
+    parser.add_argument('--repeat', type=int, default=5, help='runs per measurement')
+    parser.add_argument('--latency', type=float, default=0, help='added server latency in milliseconds')
+    parser.add_argument('--encoding', choices=('gzip', 'deflate'), help='compress the served pages')
+    parser.add_argument('--batch', type=int, default=50, help='tickers per fetch_many batch')
+    parser.add_argument('--workers', type=int, default=8, help='fetch_many worker threads')
+    parser.add_argument('--output', help='file to save the JSON results to')
+    parser.add_argument('--compare', help='JSON results of an earlier run to compare against')
+    args = parser.parse_args()
+
+    server = FixtureServer(args.fixtures, args.latency / 1000.0, args.encoding)
+    yahoo_fs.BASE_URL = server.start()
+    yahoo_fs.CHART_URL = server.chart_url
+
+    results = {
+        'revision': git_revision(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'parser': yahoo_fs.PARSER,
+        'settings': {'repeat': args.repeat, 'latency_ms': args.latency, 'encoding': args.encoding, 'batch': args.batch, 'workers': args.workers},
+        'results': {
+            'parse': bench_parse(args.fixtures, args.repeat),
+            'getters': bench_getters(args.repeat),
+            'snapshot': bench_snapshot(args.repeat),
+            'batch': bench_batch(args.batch, args.workers),
+        },
+    }
+    server.shutdown()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+    else:
+        for name, value in sorted(flatten(results['results']).items()):
+            print('%-70s %12.3f' % (name, value))
+
+
+if __name__ == '__main__':
+    main()
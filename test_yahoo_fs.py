@@ -0,0 +1,593 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+#
+# Offline tests of yahoo_fs against the fixture pages, served through the
+# local HTTP stand-in of benchmark.py.
+#
+#   python -m pytest test_yahoo_fs.py
+#   python test_yahoo_fs.py
+
+import time
+import zlib
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate
+
+import pytest
+
+import yahoo_fs
+from benchmark import FIXTURES, FixtureHandler, FixtureServer, getter_names
+
+
+server = None
+
+
+def setup_module(module=None):
+    global server
+    server = FixtureServer(FIXTURES)
+    yahoo_fs.BASE_URL = server.start()
+    yahoo_fs.CHART_URL = server.chart_url
+
+
+def teardown_module(module=None):
+    server.shutdown()
+    server.server_close()
+
+
+def fresh_quote(quote_class, ticker):
+    yahoo_fs.ticker_timezones.pop(ticker, None)
+    return quote_class(ticker)
+
+
+class OverloadedHandler(FixtureHandler):
+    """ Handler answering the first server.overloads requests of every path
+        with server.overload_status and a Retry-After of 0 seconds.
+    """
+    def do_GET(self):
+        answered = self.server.overloaded.get(self.path, 0)
+        if answered < self.server.overloads:
+            self.server.overloaded[self.path] = answered + 1
+            self.send_empty(self.server.overload_status, {'Retry-After': '0'})
+            return
+        FixtureHandler.do_GET(self)
+
+
+def overloaded_server(overloads, overload_status=503):
+    overloaded = FixtureServer(FIXTURES)
+    overloaded.RequestHandlerClass = OverloadedHandler
+    overloaded.overloads = overloads
+    overloaded.overload_status = overload_status
+    overloaded.overloaded = {}
+    return overloaded
+
+
+def test_getter_values():
+    goog = fresh_quote(yahoo_fs.Share, 'GOOG')
+    assert goog.get_price() == '1,021.57'
+    assert goog.get_market_cap() == '705.66B'
+    assert goog.get_trailing_pe() == '56.30'
+    assert goog.get_dividend_date() == 'N/A'
+    assert goog.get_previous_trade_time() == '4:00PM'
+    assert goog.get_trade_timezone() == 'EDT'
+    assert goog.get_company_name() == 'Alphabet Inc.'
+    assert goog.get_sector() == 'Technology'
+    assert goog.get_company_address() == {'street': '1600 Amphitheatre Parkway', 'address': 'Mountain View, CA 94043', 'country': 'United States'}
+    assert goog.get_key_executives()[0] == {'Name': 'Mr. Lawrence Page', 'Title': 'Co-Founder, CEO & Director', 'Pay': '650k', 'Exercised': 'N/A', 'Year Born': '1973'}
+
+    spy = fresh_quote(yahoo_fs.ETF, 'SPY')
+    assert spy.get_price() == '258.05'
+    assert spy.get_net_assets() == '291.72B'
+    assert spy.get_pe_ratio() == 'N/A'
+    assert spy.get_beta() == '1.00'
+
+
+def test_embedded_data_matches_dom(monkeypatch):
+    def read_all(quote_class, ticker):
+        quote = fresh_quote(quote_class, ticker)
+        return dict((name, getattr(quote, name)()) for name in getter_names(quote_class))
+
+    for quote_class, ticker in ((yahoo_fs.Share, 'GOOG'), (yahoo_fs.ETF, 'SPY')):
+        embedded = read_all(quote_class, ticker)
+        with monkeypatch.context() as patch:
+            patch.setattr(yahoo_fs, 'find_page_data', lambda content: {})
+            dom = read_all(quote_class, ticker)
+        assert embedded == dom
+
+    # Embedded statistics are found under their own heading only
+    goog = fresh_quote(yahoo_fs.Share, 'GOOG')
+    assert goog.get_custom_statistics_search('Trading Information', 'Beta') == goog.get_beta() == '1.21'
+    assert goog.get_custom_statistics_search('Valuation Measures', 'Beta') == None
+
+
+def test_concurrent_load():
+    latency = 0.5
+    slow_server = FixtureServer(FIXTURES, latency=latency)
+    slow_url = slow_server.start()
+    try:
+        spy = fresh_quote(yahoo_fs.ETF, 'SPY')
+        for page in spy.pages:
+            setattr(spy, 'url_' + page, getattr(spy, 'url_' + page).replace(yahoo_fs.BASE_URL, slow_url))
+
+        started = time.perf_counter()
+        spy.load()
+        elapsed = time.perf_counter() - started
+    finally:
+        slow_server.shutdown()
+        slow_server.server_close()
+
+    # The five pages are downloaded side by side, not one after another
+    assert all('content_' + page in spy.__dict__ for page in spy.pages)
+    assert latency <= elapsed < 2 * latency
+    assert spy.snapshot() == fresh_quote(yahoo_fs.ETF, 'SPY').to_dict()
+
+
+def test_unknown_ticker():
+    nope = fresh_quote(yahoo_fs.Share, 'NOPE')
+    del server.statuses[:]
+    assert nope.get_price() == None
+    assert nope.get_change() == None
+    assert nope.get_company_address() == None
+    assert not 'content_summary' in nope.__dict__
+    assert server.statuses == [404, 404]
+
+    # Each failed page is requested once, until load() or refresh() retries it
+    nope.snapshot()
+    nope.snapshot()
+    assert len(server.statuses) == 4
+    nope.to_dict()
+    assert len(server.statuses) == 8
+    nope.refresh()
+    nope.get_price()
+    nope.get_change()
+    assert len(server.statuses) == 9
+
+    results = list(yahoo_fs.fetch_many(['GOOG', 'NOPE'], pages=['summary']))
+    assert sorted((result.ticker, result.error == None) for result in results) == [('GOOG', True), ('NOPE', False)]
+
+
+def test_async_records():
+    async def records(ticker):
+        quote = fresh_quote(yahoo_fs.AsyncShare, ticker)
+        return [await quote.get_summary_record(), await quote.get_statistics_record(), await quote.get_summary_record()]
+
+    del server.statuses[:]
+    summary, statistics, again = asyncio.run(records('GOOG'))
+    assert (summary.price, statistics.market_cap) == (1021.57, 705.66e9)
+    assert again == summary
+    assert server.statuses == [200, 200]
+
+    del server.statuses[:]
+    summary, statistics, again = asyncio.run(records('NOPE'))
+    assert summary.price == None and statistics.market_cap == None
+    assert server.statuses == [404, 404]
+
+
+def test_iter_historical_range():
+    goog = fresh_quote(yahoo_fs.Share, 'GOOG')
+    rows = goog.get_historical_range('2017-01-01', '2018-06-01')
+    assert len(rows) > 0
+    assert list(goog.iter_historical_range('2017-01-01', '2018-06-01')) == rows
+
+    chart_rows = goog.get_historical_range('2017-01-01', '2018-06-01', backend='chart')
+    assert list(goog.iter_historical_range('2017-01-01', '2018-06-01', backend='chart')) == chart_rows
+
+    async def iterate(backend):
+        quote = yahoo_fs.AsyncShare('GOOG')
+        return [row async for row in quote.iter_historical_range('2017-01-01', '2018-06-01', backend=backend)]
+
+    assert asyncio.run(iterate('html')) == rows
+    # The timezone is known by now, leaving the one chart request of the range
+    del server.statuses[:]
+    assert asyncio.run(iterate('chart')) == chart_rows
+    assert server.statuses == [200]
+
+
+def test_history_backends():
+    for quote_class, ticker, event in ((yahoo_fs.Share, 'GOOG', {'Date': 'Dec 01 2017', 'Dividend': '2/1 Stock Split'}),
+                                       (yahoo_fs.ETF, 'SPY', {'Date': 'Feb 09 2018', 'Dividend': '1.351 Dividend'})):
+        rows = {}
+        for backend in ('html', 'chart'):
+            quote = fresh_quote(quote_class, ticker)
+            rows[backend] = quote.get_historical_range('2017-11-01', '2018-03-23', backend=backend)
+        assert len(rows['html']) > 0
+        assert rows['chart'] == rows['html']
+        assert event in rows['html']
+
+    goog = fresh_quote(yahoo_fs.Share, 'GOOG')
+    assert goog.get_historical_day('2018-03-20', backend='chart')[0]['Close'] == '978.28'
+
+
+def test_compressed_responses():
+    for encoding in ('gzip', 'deflate'):
+        compressed_server = FixtureServer(FIXTURES, encoding=encoding)
+        url = compressed_server.start() + 'GOOG'
+        try:
+            response = yahoo_fs.default_session.request(url)
+            with open(FIXTURES + '/GOOG/summary.html', 'rb') as f:
+                assert response.body == f.read()
+            assert yahoo_fs.response_header(response, 'Content-Encoding') == None
+            assert len(compressed_server.bodies) == 2
+
+            async_response = asyncio.run(yahoo_fs.AsyncSession().request(url))
+            assert async_response.body == response.body
+        finally:
+            compressed_server.shutdown()
+            compressed_server.server_close()
+
+
+def test_content_decoder():
+    with open(FIXTURES + '/GOOG/summary.html', 'rb') as f:
+        body = f.read()
+
+    def compressed(wbits):
+        compressor = zlib.compressobj(9, zlib.DEFLATED, wbits)
+        return compressor.compress(body) + compressor.flush()
+
+    streams = [('gzip', 16 + zlib.MAX_WBITS), ('deflate', zlib.MAX_WBITS), ('deflate', -zlib.MAX_WBITS)]
+    for encoding, wbits in streams:
+        data = compressed(wbits)
+        for chunk_size in (len(data), 1024, 1):
+            decoder = yahoo_fs.ContentDecoder(encoding)
+            chunks = [decoder.decompress(data[n:n + chunk_size]) for n in range(0, len(data), chunk_size)]
+            assert b''.join(chunks) + decoder.flush() == body
+
+    empty = yahoo_fs.ContentDecoder('deflate')
+    assert empty.decompress(b'') + empty.flush() == b''
+    with pytest.raises(zlib.error):
+        yahoo_fs.ContentDecoder('gzip').decompress(compressed(zlib.MAX_WBITS))
+
+    assert yahoo_fs.content_decoder({'content-encoding': ' X-GZIP '}).encoding == 'gzip'
+    assert yahoo_fs.content_decoder({'content-encoding': 'deflate'}).encoding == 'deflate'
+    assert yahoo_fs.content_decoder({'content-encoding': 'br'}) == None
+    assert yahoo_fs.content_decoder({}) == None
+    headers = {'Content-Encoding': 'gzip', 'Content-Length': '123', 'Content-Type': 'text/html'}
+    assert yahoo_fs.decoded_headers(headers) == {'Content-Type': 'text/html'}
+
+
+def test_refresh_not_modified():
+    goog = fresh_quote(yahoo_fs.Share, 'GOOG')
+    goog.get_price()
+    data = goog.data_summary
+    del server.statuses[:]
+
+    goog.refresh(pages=['summary'])
+    assert server.statuses == [304]
+    assert goog.data_summary is data
+    assert goog.get_price() == '1,021.57'
+
+
+
+def test_async_page_attributes():
+    async def read():
+        goog = fresh_quote(yahoo_fs.AsyncShare, 'GOOG')
+        assert not hasattr(goog, 'soup_summary')
+        assert getattr(goog, 'content_summary', None) == None
+        price = await goog.get_price()
+        assert hasattr(goog, 'soup_summary')
+        return price
+
+    assert asyncio.run(read()) == '1,021.57'
+
+
+def test_cache_ttls(monkeypatch, tmp_path):
+    now = [1500000000.0]
+    monkeypatch.setattr(yahoo_fs.time, 'time', lambda: now[0])
+
+    cache = yahoo_fs.ResponseCache(str(tmp_path / 'cache.sqlite'), max_entries=2, ttls={'summary': 10})
+    summary_url = yahoo_fs.BASE_URL + 'GOOG'
+    statistics_url = yahoo_fs.BASE_URL + 'GOOG/key-statistics?p=GOOG'
+    closed_url = yahoo_fs.history_url(yahoo_fs.BASE_URL + 'GOOG', 1400000000, 1400000000 + 86400)
+    open_url = yahoo_fs.history_url(yahoo_fs.BASE_URL + 'GOOG', int(now[0]) - 86400, int(now[0]))
+
+    assert cache.ttl(summary_url) == 10
+    assert cache.ttl(statistics_url) == 24 * 3600
+    assert cache.ttl(closed_url) == None
+    assert cache.ttl(open_url) == 15 * 60
+
+    for url in (summary_url, statistics_url, closed_url, open_url):
+        cache.set(url, url.encode())
+    now[0] += 11
+    assert cache.get(summary_url) == None
+    assert cache.get(statistics_url) == statistics_url.encode()
+
+    # Closed history windows never expire, and outlive the in-memory LRU in SQLite
+    now[0] += 365 * 24 * 3600
+    assert cache.get(open_url) == None
+    assert cache.get(statistics_url) == None
+    assert cache.get(closed_url) == closed_url.encode()
+    assert yahoo_fs.ResponseCache(str(tmp_path / 'cache.sqlite')).get(closed_url) == closed_url.encode()
+
+    # A page type without a TTL is never stored
+    cache.ttls['summary'] = 0
+    cache.set(summary_url, b'summary')
+    assert cache.get(summary_url) == None
+
+
+def test_cached_fetch(monkeypatch):
+    monkeypatch.setattr(yahoo_fs, 'default_cache', yahoo_fs.ResponseCache())
+    url = yahoo_fs.BASE_URL + 'GOOG/profile?p=GOOG'
+    del server.statuses[:]
+    body = yahoo_fs.fetch_page(url)
+    assert yahoo_fs.fetch_page(url) == body
+    assert asyncio.run(yahoo_fs.async_fetch_page(url)) == body
+    assert server.statuses == [200]
+
+
+def test_refresh_changed_page():
+    fixture = FIXTURES + '/GOOG/summary.html'
+    goog = fresh_quote(yahoo_fs.Share, 'GOOG')
+    assert goog.get_price() == '1,021.57'
+    index = goog.index_summary
+
+    server.bodies[fixture] = server.read(fixture).replace(b'1,021.57', b'1,030.00')
+    try:
+        del server.statuses[:]
+        goog.refresh()
+        assert server.statuses == [200]
+        assert goog.get_price() == '1,030.00'
+        assert not goog.index_summary is index
+
+        async def refresh():
+            async_goog = fresh_quote(yahoo_fs.AsyncShare, 'GOOG')
+            await async_goog.load(['summary'])
+            del server.statuses[:]
+            await async_goog.refresh()
+            return await async_goog.get_price()
+
+        assert asyncio.run(refresh()) == '1,030.00'
+        assert server.statuses == [304]
+    finally:
+        del server.bodies[fixture]
+
+
+def test_snapshot_reads_page_indexes():
+    for quote_class, ticker in ((yahoo_fs.Share, 'GOOG'), (yahoo_fs.ETF, 'SPY')):
+        quote = fresh_quote(quote_class, ticker)
+        snapshot = quote.to_dict()
+        assert snapshot['ticker'] == ticker
+
+        # Every field is served from the page indexes, not by walking the soup again
+        for page in quote.pages:
+            getattr(quote, 'index_' + page)
+            quote.__dict__['soup_' + page] = None
+        assert quote.snapshot() == snapshot
+
+        # The getters return copies of the indexed values
+        for value in snapshot.values():
+            if isinstance(value, dict):
+                value.clear()
+        assert quote.snapshot() == quote_class(ticker).to_dict()
+
+
+def test_combine_historical_chunks():
+    def rows(*days):
+        return [{'Date': yahoo_fs.history_date(yahoo_fs.date_ordinal(day)), 'Close': day} for day in days]
+
+    # Windows overlap on their boundary day, and each lists its rows newest first
+    chunks = [rows('2018-01-31', '2018-01-30', '2017-12-29'), rows('2018-03-01', '2018-02-01', '2018-01-31')]
+    chunks[1].insert(1, {'Date': 'Feb 09 2018', 'Dividend': '1.351 Dividend'})
+    combined = yahoo_fs.combine_historical_chunks(chunks, 'range')
+    assert [row['Date'] for row in combined] == ['Dec 29 2017', 'Jan 30 2018', 'Jan 31 2018', 'Feb 01 2018', 'Feb 09 2018', 'Mar 01 2018']
+    assert {'Date': 'Feb 09 2018', 'Dividend': '1.351 Dividend'} in combined
+
+
+def test_sync_history(monkeypatch, tmp_path):
+    # The chart backend only returns the requested window of the fixture
+    monkeypatch.setattr(yahoo_fs, 'HISTORY_BACKEND', 'chart')
+    full = yahoo_fs.PriceStore(str(tmp_path / 'full.sqlite'))
+    total = yahoo_fs.sync_history('GOOG', full, to_date='2018-03-23')
+    expected = full.history('GOOG')
+
+    store = yahoo_fs.PriceStore(str(tmp_path / 'prices.sqlite'))
+    assert yahoo_fs.sync_history('GOOG', store, to_date='2018-03-01') > 0
+    assert store.last_date('GOOG') == '2018-03-01'
+
+    # A new dividend changed the Adj Close of the newest stored row, the older rows are rescaled
+    store.scale_adj_close('GOOG', 0.5)
+    assert yahoo_fs.sync_history('GOOG', store, to_date='2018-03-07') == 5
+    assert store.history('GOOG') == full.history('GOOG', to_date='2018-03-07')
+
+    # A new split changed its Close, the whole history is downloaded again
+    store._database.execute("UPDATE prices SET close = close * 2 WHERE date = '2018-03-07'")
+    assert yahoo_fs.sync_history('GOOG', store, to_date='2018-03-23') == total
+    assert store.history('GOOG') == expected
+
+
+def test_parse_value():
+    parse_value = yahoo_fs.parse_value
+    assert parse_value('1,021.57') == 1021.57
+    assert parse_value('183,534,838') == 183534838
+    assert parse_value('+2.62') == 2.62
+    assert parse_value('705.66B') == 705.66e9
+    assert parse_value('650k') == 650000
+    assert parse_value('1.2T') == 1.2e12
+    assert parse_value('-2.13%') == -0.0213
+    assert parse_value('980.64 - 1,024.23') == (980.64, 1024.23)
+    assert parse_value('1,014.74 x 200') == (1014.74, 200)
+    assert parse_value('Mar 23, 2018') == yahoo_fs.datetime(2018, 3, 23).date()
+    assert parse_value('1993-01-22') == yahoo_fs.datetime(1993, 1, 22).date()
+    assert parse_value('N/A') == None
+    assert parse_value('-') == None
+    assert parse_value('2/1') == '2/1'
+    assert parse_value('NasdaqGS') == 'NasdaqGS'
+    assert parse_value({'Pay': '650k', 'Title': 'CEO', 'Exercised': 'N/A'}) == {'Pay': 650000, 'Title': 'CEO', 'Exercised': None}
+
+    goog = fresh_quote(yahoo_fs.Share, 'GOOG')
+    assert goog.to_dict(['profile'], typed=True)['key_executives'][0]['Pay'] == 650000
+
+
+def test_utc_offsets(monkeypatch):
+    def offset(timezone, date):
+        return yahoo_fs.utc_offset(timezone, yahoo_fs.date_ordinal(date)) / 3600.0
+
+    if yahoo_fs.zone_info('America/New_York') == None:
+        pytest.skip('no zoneinfo data')
+    assert offset('EDT', '2018-01-02') == -5
+    assert offset('EDT', '2018-03-23') == -4
+    assert offset('AEDT', '2018-01-02') == 11
+    assert offset('AEDT', '2018-07-02') == 10
+    assert offset('IST', '2018-07-02') == 5.5
+    assert offset('XYZ', '2018-07-02') == 0
+    assert yahoo_fs.timestamp_setup('2018-03-23', 'EDT') == 1521777600
+
+    # Without zoneinfo the fixed offsets are used
+    monkeypatch.setattr(yahoo_fs, 'ZoneInfo', None)
+    yahoo_fs.zone_info.cache_clear()
+    yahoo_fs.utc_offset.cache_clear()
+    try:
+        assert offset('EDT', '2018-03-23') == -5
+        assert offset('AEDT', '2018-01-02') == 10
+    finally:
+        yahoo_fs.zone_info.cache_clear()
+        yahoo_fs.utc_offset.cache_clear()
+
+
+def test_record_and_replay(monkeypatch, tmp_path):
+    cassettes = str(tmp_path / 'cassettes')
+    monkeypatch.setattr(yahoo_fs, 'default_session', yahoo_fs.RecordingTransport(cassettes))
+    monkeypatch.setattr(yahoo_fs, 'default_async_session', yahoo_fs.AsyncRecordingTransport(cassettes))
+    recorded = fresh_quote(yahoo_fs.Share, 'GOOG').to_dict()
+    async_url = yahoo_fs.BASE_URL + 'SPY'
+    async_body = asyncio.run(yahoo_fs.async_fetch_page(async_url))
+
+    monkeypatch.setattr(yahoo_fs, 'default_session', yahoo_fs.ReplayTransport(cassettes))
+    monkeypatch.setattr(yahoo_fs, 'default_async_session', yahoo_fs.AsyncReplayTransport(cassettes))
+    del server.statuses[:]
+    goog = fresh_quote(yahoo_fs.Share, 'GOOG')
+    assert goog.to_dict() == recorded
+    assert asyncio.run(yahoo_fs.async_fetch_page(async_url)) == async_body
+    assert fresh_quote(yahoo_fs.Share, 'MSFT').get_price() == None
+
+    # Conditional requests are answered from the recorded ETag
+    assert yahoo_fs.default_session.replay(goog.url_summary, yahoo_fs.conditional_headers(goog.url_summary)).status == 304
+    data = goog.data_summary
+    goog.refresh(['summary'])
+    assert goog.data_summary is data
+    assert server.statuses == []
+
+    delays = [yahoo_fs.ReplayTransport(cassettes, latency=0.2, jitter=0.05, seed=1).delay() for i in range(2)]
+    assert delays[0] == delays[1] and 0.2 <= delays[0] <= 0.25
+
+
+def test_metrics(monkeypatch):
+    assert not yahoo_fs.metrics.enabled
+    fresh_quote(yahoo_fs.Share, 'GOOG').get_price()
+    assert yahoo_fs.metrics.summary() == {}
+
+    metrics = yahoo_fs.Metrics(enabled=True)
+    observations = []
+    metrics.hooks.append(lambda name, value, labels: observations.append(name))
+    monkeypatch.setattr(yahoo_fs, 'metrics', metrics)
+    goog = fresh_quote(yahoo_fs.Share, 'GOOG')
+    goog.get_price()
+    goog.get_price()
+
+    summary = metrics.summary()
+    assert summary['http_request_seconds']['page=summary']['count'] == 1
+    assert summary['getter_seconds']['getter=get_price,quote=Share']['count'] == 2
+    # The page load is left out of the getter time
+    assert summary['getter_seconds']['getter=get_price,quote=Share']['max'] < summary['http_request_seconds']['page=summary']['sum']
+    assert 'http_request_seconds' in observations
+    assert '# TYPE yahoo_fs_http_request_seconds histogram' in metrics.prometheus()
+
+
+def test_retry_policy():
+    def response(status, retry_after):
+        return yahoo_fs.Response('url', status, '', {'retry-after': retry_after}, b'')
+
+    policy = yahoo_fs.RetryPolicy(retries=3, backoff=1, max_delay=30)
+    assert policy.retry_after(response(429, '5')) == 5
+    assert policy.retry_after(response(503, '0')) == 0
+    assert policy.retry_after(response(500, '5')) == None
+    assert policy.retry_after(response(429, 'soon')) == None
+    assert 95 < policy.retry_after(response(503, formatdate(time.time() + 100, usegmt=True))) <= 100
+    assert policy.retry_after(response(503, formatdate(time.time() - 100, usegmt=True))) == 0
+
+    # Retry-After and the backoff are both capped by max_delay
+    assert policy.delay(0, response(429, '120')) == 30
+    assert all(0 <= policy.delay(2) <= 4 for i in range(100))
+    assert all(0 <= policy.delay(10) <= 30 for i in range(100))
+
+
+def test_rate_limiter(monkeypatch):
+    now = [100.0]
+    sleeps = []
+    monkeypatch.setattr(yahoo_fs.time, 'monotonic', lambda: now[0])
+    monkeypatch.setattr(yahoo_fs.time, 'sleep', sleeps.append)
+
+    assert yahoo_fs.RateLimiter().reserve() == 0
+    limiter = yahoo_fs.RateLimiter(rate=10, burst=2)
+    assert [limiter.reserve() for i in range(4)] == [0, 0, pytest.approx(0.1), pytest.approx(0.2)]
+    now[0] += 0.4
+    assert [limiter.reserve() for i in range(2)] == [0, 0]
+    limiter.acquire()
+    assert sleeps == [pytest.approx(0.1)]
+
+
+def test_request_retries(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(yahoo_fs.time, 'sleep', sleeps.append)
+    monkeypatch.setattr(yahoo_fs, 'default_retry_policy', yahoo_fs.RetryPolicy(retries=3, backoff=0.5, max_delay=0.6))
+
+    for overloads, overload_status in ((2, 503), (10, 500)):
+        overloaded = overloaded_server(overloads, overload_status)
+        url = overloaded.start() + 'GOOG'
+        try:
+            del sleeps[:]
+            response = yahoo_fs.request_page(url)
+            statuses = list(overloaded.statuses)
+            delays = list(sleeps)
+            assert yahoo_fs.open_page_content(url) == (None if overloads > 3 else response.body)
+        finally:
+            overloaded.shutdown()
+            overloaded.server_close()
+
+        if overloads <= 3:
+            # The Retry-After of the 503 responses is followed
+            assert statuses == [503, 503, 200]
+            assert delays == [0, 0]
+        else:
+            assert response.status == 500 and statuses == [500] * 4
+            assert len(delays) == 3 and all(0 <= delay <= min(0.5 * 2 ** attempt, 0.6) for attempt, delay in enumerate(delays))
+
+def test_adaptive_concurrency(monkeypatch):
+    def fetch_all(concurrency, base_url, count):
+        # A query string per request makes every url a path of its own for OverloadedHandler
+        urls = [base_url + 'GOOG?n=%d' % n for n in range(count)]
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            return list(executor.map(concurrency.fetch_page, urls))
+
+    healthy = yahoo_fs.AdaptiveConcurrency(initial=4, max_latency=30)
+    fetch_all(healthy, yahoo_fs.BASE_URL, 60)
+    assert healthy.limit > 4
+
+    # Every page succeeds on its retry, yet each first 429 is an overload
+    overloaded = overloaded_server(1, 429)
+    base_url = overloaded.start()
+    try:
+        concurrency = yahoo_fs.AdaptiveConcurrency(initial=4, max_latency=30)
+        bodies = fetch_all(concurrency, base_url, 60)
+        statuses = list(overloaded.statuses)
+    finally:
+        overloaded.shutdown()
+        overloaded.server_close()
+    assert all(bodies) and statuses.count(429) == 60 and statuses.count(200) == 60
+    assert concurrency.limit < 4
+
+    # Unknown tickers and cached pages say nothing about the server load
+    concurrency = yahoo_fs.AdaptiveConcurrency(initial=4, max_latency=30)
+    with pytest.raises(yahoo_fs.HTTPError):
+        concurrency.fetch_page(yahoo_fs.BASE_URL + 'NOPE')
+    assert concurrency.limit == 4
+
+    monkeypatch.setattr(yahoo_fs, 'default_cache', yahoo_fs.ResponseCache())
+    yahoo_fs.fetch_page(yahoo_fs.BASE_URL + 'GOOG')
+    del server.statuses[:]
+    for n in range(10):
+        concurrency.fetch_page(yahoo_fs.BASE_URL + 'GOOG')
+    assert server.statuses == [] and concurrency.limit == 4
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(pytest.main([__file__, '-q']))
@@ -8,33 +8,1751 @@
 # Version: 0.0.6
 # Website: https://www.fredrikbakken.no/
 
-import sys
+import os
+import re
+import abc
+import copy
+import json
 import math
-import calendar
-from datetime import datetime, timedelta
+import heapq
+import bisect
+import random
+import socket
+import base64
+import hashlib
+import zlib
+import time
+import sqlite3
+import asyncio
+import functools
+import threading
+from itertools import islice
+from collections import namedtuple, OrderedDict, deque
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from bs4 import BeautifulSoup, SoupStrainer, FeatureNotFound
+
+try:
+    import lxml
+    PARSER = 'lxml'
+except ImportError:
+    PARSER = 'html.parser'
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    from zoneinfo import ZoneInfo
+except ImportError:
+    ZoneInfo = None
+
+import http.client
+from urllib.error import HTTPError
+from urllib.parse import urljoin, urlsplit, parse_qs, unquote
+from urllib.request import getproxies, proxy_bypass
+
+BASE_URL = 'https://finance.yahoo.com/quote/'
+CHART_URL = 'https://query1.finance.yahoo.com/v8/finance/chart/'
+HISTORY_WORKERS = 4
+HISTORY_BACKEND = 'html'
+DEFAULT_HEADERS = {'User-Agent': 'Mozilla/5.0 (compatible; yahoo_fs)', 'Accept-Encoding': 'gzip, deflate'}
+READ_SIZE = 64 * 1024
+
+# Lazily loaded attributes of each page, see lazy_page_attribute
+PAGE_ATTRIBUTES = ('content', 'data', 'soup', 'index')
+
+# Element attributes which are looked up by the getters, see index_soup
+INDEXED_ATTRIBUTES = ('id', 'class', 'target', 'data-test', 'data-reactid')
+
+# Parts of a page which are kept when parsing, see make_soup
+PAGE_STRAINERS = {
+    'summary': SoupStrainer(id=['quote-header-info', 'quote-market-notice', 'quote-summary']),
+    'history': SoupStrainer('table', attrs={'class': re.compile(r'(^|\s)W\(100%\)(\s|$)')}),
+}
+
+
+Response = namedtuple('Response', ['url', 'status', 'reason', 'headers', 'body'])
+BatchResult = namedtuple('BatchResult', ['ticker', 'quote', 'error'])
+
+
+def response_header(response, name):
+    """ Method for reading a response header case-insensitively.
+    """
+    name = name.lower()
+    for key, value in response.headers.items():
+        if key.lower() == name:
+            return value
+    return None
+
+
+def url_page_type(url):
+    """ Method for finding the page type of a quote url, e.g. 'summary',
+        'statistics' or 'history'. Chart urls are history pages.
+    """
+    if url.startswith(CHART_URL):
+        return 'history'
+    if url.startswith(BASE_URL):
+        path = urlsplit(url[len(BASE_URL):]).path
+    else:
+        path = urlsplit(url).path.split('/quote/', 1)[-1]
+
+    parts = path.strip('/').split('/')
+    if len(parts) < 2:
+        return 'summary'
+    return parts[1].replace('key-', '')
+
+
+class Metrics(object):
+    """ Collector of counters and histograms about page downloads, parsing
+        and getters, exported by summary() and prometheus(). Every
+        observation is also passed on to the callables in hooks, as
+        hook(name, value, labels). Nothing is recorded until enabled is set.
+    """
+    prefix = 'yahoo_fs_'
+    buckets = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+    descriptions = {
+        'http_request_seconds': ('histogram', 'Latency of page requests.'),
+        'http_response_bytes': ('counter', 'Bytes of downloaded page bodies.'),
+        'http_errors': ('counter', 'Page requests answered with an HTTP error.'),
+        'cache_hits': ('counter', 'Page reads served by the response cache.'),
+        'parse_seconds': ('histogram', 'Time spent parsing page content.'),
+        'index_seconds': ('histogram', 'Time spent indexing parsed pages.'),
+        'getter_seconds': ('histogram', 'Time spent in get_* methods, excluding page loads.'),
+        'retries': ('counter', 'Page requests retried after an error.'),
+    }
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.hooks = []
+
+        self._lock = threading.Lock()
+        self._series = {}
+        self._local = threading.local()
+
+
+    def increment(self, name, value=1, **labels):
+        """ Method for adding value to a counter.
+        """
+        self._record(name, value, labels, False)
+
+
+    def observe(self, name, seconds, **labels):
+        """ Method for adding a timing to a histogram.
+        """
+        self._record(name, seconds, labels, True)
+
+
+    def _record(self, name, value, labels, histogram):
+        if not self.enabled:
+            return
+
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            series = self._series.get(key)
+            if series == None:
+                series = self._series[key] = {'count': 0, 'sum': 0, 'max': 0, 'buckets': [0] * len(self.buckets) if histogram else None}
+            series['count'] += 1
+            series['sum'] += value
+            series['max'] = max(series['max'], value)
+            if histogram:
+                bucket = bisect.bisect_left(self.buckets, value)
+                if bucket < len(self.buckets):
+                    series['buckets'][bucket] += 1
+
+        for hook in self.hooks:
+            hook(name, value, labels)
+
+
+    def loading(self):
+        """ Method for reading the seconds this thread has spent loading
+            pages, which are left out of the getter timings.
+        """
+        return getattr(self._local, 'loading', 0)
+
+
+    def add_loading(self, seconds):
+        self._local.loading = self.loading() + seconds
+
+
+    def _snapshot(self):
+        with self._lock:
+            return sorted(((key, dict(series)) for key, series in self._series.items()), key=lambda item: (item[0][0], str(item[0][1])))
+
+
+    def summary(self):
+        """ Method for summarizing every series as count, sum, mean and max,
+            keyed by metric name and 'label=value,...' text.
+        """
+        summary = {}
+        for (name, labels), series in self._snapshot():
+            label_text = ','.join('%s=%s' % label for label in labels)
+            summary.setdefault(name, {})[label_text] = {
+                'count': series['count'],
+                'sum': series['sum'],
+                'mean': series['sum'] / series['count'],
+                'max': series['max'],
+            }
+        return summary
+
+
+    def prometheus(self):
+        """ Method for exporting every series in the Prometheus text format.
+        """
+        def label_text(labels):
+            if len(labels) == 0:
+                return ''
+            return '{%s}' % ','.join('%s="%s"' % (key, str(value).replace('\\', '\\\\').replace('"', '\\"')) for key, value in labels)
+
+        lines = []
+        described = set()
+        for (name, labels), series in self._snapshot():
+            kind, description = self.descriptions.get(name, ('histogram' if series['buckets'] else 'counter', name))
+            metric = self.prefix + name + ('_total' if kind == 'counter' else '')
+            if not name in described:
+                described.add(name)
+                lines.append('# HELP %s %s' % (metric, description))
+                lines.append('# TYPE %s %s' % (metric, kind))
+
+            if kind == 'counter':
+                lines.append('%s%s %s' % (metric, label_text(labels), series['sum']))
+                continue
+
+            cumulative = 0
+            for bound, count in zip(self.buckets, series['buckets']):
+                cumulative += count
+                lines.append('%s_bucket%s %d' % (metric, label_text(labels + (('le', repr(float(bound))),)), cumulative))
+            lines.append('%s_bucket%s %d' % (metric, label_text(labels + (('le', '+Inf'),)), series['count']))
+            lines.append('%s_sum%s %s' % (metric, label_text(labels), series['sum']))
+            lines.append('%s_count%s %d' % (metric, label_text(labels), series['count']))
+        return '\n'.join(lines) + '\n'
+
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+
+metrics = Metrics()
+
+
+def observe_response(url, started, status, body=None):
+    """ Method for recording the latency, size and status of a page request
+        started at time.perf_counter() value started.
+    """
+    page = url_page_type(url)
+    metrics.observe('http_request_seconds', time.perf_counter() - started, page=page)
+    if status >= 400:
+        metrics.increment('http_errors', page=page, status=status)
+    elif not body == None:
+        metrics.increment('http_response_bytes', len(body), page=page)
+
+
+class ContentDecoder(object):
+    """ Incremental decompressor of gzip and deflate response bodies.
+        Deflate bodies should be zlib streams, but raw deflate streams sent
+        by some servers are accepted too.
+    """
+
+    def __init__(self, encoding):
+        self.encoding = encoding
+        self._head = b''
+        self._decompressor = None if encoding == 'deflate' else zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+
+    def _start(self):
+        # A zlib stream starts with the compression method 8 and a header check
+        # making its first two bytes a multiple of 31, which tells it from raw deflate
+        head = bytearray(self._head[:2])
+        zlib_stream = len(head) == 2 and head[0] & 0x0f == 8 and (head[0] * 256 + head[1]) % 31 == 0
+        self._decompressor = zlib.decompressobj(zlib.MAX_WBITS if zlib_stream else -zlib.MAX_WBITS)
+        data, self._head = self._head, b''
+        return self._decompressor.decompress(data)
+
+
+    def decompress(self, data):
+        if self._decompressor == None:
+            self._head += data
+            if len(self._head) < 2:
+                return b''
+            return self._start()
+        return self._decompressor.decompress(data)
+
+
+    def flush(self):
+        if self._decompressor == None:
+            return self._start() + self._decompressor.flush()
+        return self._decompressor.flush()
+
+
+def content_decoder(headers):
+    """ Method for building the ContentDecoder of a response from its
+        headers, returning None when the body is not compressed.
+    """
+    encoding = (headers.get('content-encoding') or '').strip().lower()
+    if encoding in ('gzip', 'x-gzip', 'deflate'):
+        return ContentDecoder('deflate' if encoding == 'deflate' else 'gzip')
+    return None
+
+
+def decoded_headers(headers):
+    """ Method for removing the headers which describe the compressed body
+        from the headers of a decompressed response.
+    """
+    return dict((key, value) for key, value in headers.items() if not key.lower() in ('content-encoding', 'content-length'))
+
+
+_validators = OrderedDict()
+_validators_lock = threading.Lock()
+
+
+def store_validators(url, response, max_entries=4096):
+    """ Method for remembering the ETag/Last-Modified validators of a
+        response, for later conditional requests.
+    """
+    etag = response_header(response, 'ETag')
+    last_modified = response_header(response, 'Last-Modified')
+    if response.status == 200 and (etag or last_modified):
+        with _validators_lock:
+            _validators[url] = (etag, last_modified)
+            _validators.move_to_end(url)
+            if len(_validators) > max_entries:
+                _validators.popitem(last=False)
+
+
+def conditional_headers(url):
+    """ Method for building If-None-Match/If-Modified-Since headers from
+        the stored validators of a url.
+    """
+    with _validators_lock:
+        etag, last_modified = _validators.get(url, (None, None))
+
+    headers = {}
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
+    return headers
+
+
+class Transport(abc.ABC):
+    """ Base class of the transports beneath fetch_page. A transport answers
+        request(url, headers) with a Response, see Session, RecordingTransport
+        and ReplayTransport.
+    """
+
+    @abc.abstractmethod
+    def request(self, url, headers=None):
+        """ Method for sending a GET request, returning its Response.
+        """
+
+
+    def get(self, url, headers=None):
+        """ Method for reading urls, raising HTTPError on error responses.
+        """
+        return checked_body(self.request(url, headers))
+
+
+    def close(self):
+        pass
+
+
+class Session(Transport):
+    """ HTTP transport shared by Share, ETF and historical_data, keeping a
+        pool of persistent (keep-alive) connections per host. Like urlopen,
+        requests go through the proxies of the HTTP(S)_PROXY environment
+        variables unless proxies are given, https urls through a CONNECT
+        tunnel.
+    """
+    redirect_codes = (301, 302, 303, 307, 308)
+
+    def __init__(self, pool_size=10, timeout=30, max_redirects=5, proxies=None):
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.max_redirects = max_redirects
+        self.headers = dict(DEFAULT_HEADERS)
+        self.proxies = getproxies() if proxies == None else proxies
+
+        self._lock = threading.Lock()
+        self._idle = {}
+        self._slots = {}
+        self._routes = {}
+
+
+    def _proxy(self, scheme, host):
+        """ Method for finding the proxy url of a host as urlsplit parts,
+            or None when it is reached directly.
+        """
+        key = (scheme, host)
+        if not key in self._routes:
+            proxy = self.proxies.get(scheme)
+            if proxy and not proxy_bypass(urlsplit('//' + host).hostname):
+                self._routes[key] = urlsplit(proxy if '://' in proxy else 'http://' + proxy)
+            else:
+                self._routes[key] = None
+        return self._routes[key]
+
+
+    def _proxy_headers(self, proxy):
+        if proxy.username == None:
+            return {}
+        credentials = '%s:%s' % (unquote(proxy.username), unquote(proxy.password or ''))
+        return {'Proxy-Authorization': 'Basic ' + base64.b64encode(credentials.encode('utf-8')).decode('ascii')}
+
+
+    def _connect(self, scheme, host):
+        proxy = self._proxy(scheme, host)
+        if proxy == None:
+            if scheme == 'https':
+                return http.client.HTTPSConnection(host, timeout=self.timeout)
+            return http.client.HTTPConnection(host, timeout=self.timeout)
+
+        if scheme == 'https':
+            connection = http.client.HTTPSConnection(proxy.hostname, proxy.port or 80, timeout=self.timeout)
+            connection.set_tunnel(host, headers=self._proxy_headers(proxy))
+            return connection
+        return http.client.HTTPConnection(proxy.hostname, proxy.port or 80, timeout=self.timeout)
+
+
+    def _checkout(self, key):
+        with self._lock:
+            if not key in self._slots:
+                self._slots[key] = threading.BoundedSemaphore(self.pool_size)
+                self._idle[key] = []
+            slots = self._slots[key]
+        slots.acquire()
+
+        with self._lock:
+            if len(self._idle[key]) > 0:
+                return self._idle[key].pop(), True
+        return self._connect(*key), False
+
+
+    def _checkin(self, key, connection, reusable):
+        if reusable:
+            with self._lock:
+                self._idle[key].append(connection)
+        else:
+            connection.close()
+        self._slots[key].release()
+
+
+    def _send(self, url, headers):
+        parts = urlsplit(url)
+        key = (parts.scheme, parts.netloc)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+
+        request_headers = dict(self.headers)
+        request_headers.update(headers or {})
+
+        # Plain http through a proxy asks the proxy for the absolute url
+        proxy = self._proxy(*key)
+        if not proxy == None and parts.scheme == 'http':
+            path = url
+            request_headers.update(self._proxy_headers(proxy))
+
+        connection, reused = self._checkout(key)
+        try:
+            try:
+                connection.request('GET', path, headers=request_headers)
+                response = connection.getresponse()
+            except (http.client.HTTPException, socket.error):
+                if not reused:
+                    raise
+                # The server closed an idle keep-alive connection, retry once on a new one
+                connection.close()
+                connection = self._connect(*key)
+                connection.request('GET', path, headers=request_headers)
+                response = connection.getresponse()
+
+            response_headers = dict(response.getheaders())
+            decoder = content_decoder(dict((header.lower(), value) for header, value in response_headers.items()))
+            if decoder == None:
+                body = response.read()
+            else:
+                chunks = []
+                while True:
+                    data = response.read(READ_SIZE)
+                    if not data:
+                        break
+                    chunks.append(decoder.decompress(data))
+                chunks.append(decoder.flush())
+                body = b''.join(chunks)
+                response_headers = decoded_headers(response_headers)
+        except Exception:
+            self._checkin(key, connection, False)
+            raise
+
+        self._checkin(key, connection, not response.will_close)
+        return Response(url, response.status, response.reason, response_headers, body)
+
+
+    def request(self, url, headers=None):
+        """ Method for sending a GET request, following redirects.
+        """
+        requested_url = url
+        for _ in range(self.max_redirects + 1):
+            response = self._send(url, headers)
+            if not response.status in self.redirect_codes:
+                break
+
+            location = response_header(response, 'Location')
+            if location == None:
+                break
+            url = urljoin(url, location)
+
+        store_validators(requested_url, response)
+        return response
+
+
+    def close(self):
+        with self._lock:
+            for connections in self._idle.values():
+                for connection in connections:
+                    connection.close()
+                del connections[:]
+
+
+class Cassette(object):
+    """ Directory of recorded responses, stored as <key>.json holding the
+        url, status, reason and headers and <key>.body holding the body,
+        where key is the SHA-1 of the requested url.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+
+    def path(self, url, extension):
+        key = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, key + extension)
+
+
+    def save(self, url, response):
+        with open(self.path(url, '.body'), 'wb') as f:
+            f.write(response.body)
+        with open(self.path(url, '.json'), 'w') as f:
+            json.dump({'url': url, 'status': response.status, 'reason': response.reason, 'headers': response.headers}, f, indent=2, sort_keys=True)
+
+
+    def load(self, url):
+        """ Method for reading the recorded response of a url, returning
+            None when the url was never recorded.
+        """
+        try:
+            with open(self.path(url, '.json')) as f:
+                meta = json.load(f)
+            with open(self.path(url, '.body'), 'rb') as f:
+                body = f.read()
+        except (IOError, OSError):
+            return None
+        return Response(meta['url'], meta['status'], meta['reason'], meta['headers'], body)
+
+
+class RecordingTransport(Transport):
+    """ Transport passing every request on to another transport, a new
+        Session by default, and saving the responses to a cassette directory.
+    """
+
+    def __init__(self, directory, transport=None):
+        self.cassette = Cassette(directory)
+        self.transport = transport or Session()
+
+
+    def record(self, url, response):
+        # A 304 has no body, keep the recorded full response
+        if not response.status == 304:
+            self.cassette.save(url, response)
+        return response
+
+
+    def request(self, url, headers=None):
+        return self.record(url, self.transport.request(url, headers))
+
+
+    def close(self):
+        self.transport.close()
+
+
+class AsyncRecordingTransport(RecordingTransport):
+    """ Asyncio counterpart of RecordingTransport, for default_async_session,
+        passing every request on to a new AsyncSession by default.
+    """
+
+    def __init__(self, directory, transport=None):
+        self.cassette = Cassette(directory)
+        self.transport = transport or AsyncSession()
+
+
+    async def request(self, url, headers=None):
+        return self.record(url, await self.transport.request(url, headers))
+
+
+    async def get(self, url, headers=None):
+        return checked_body(await self.request(url, headers))
+
 
-from bs4 import BeautifulSoup
+class ReplayTransport(Transport):
+    """ Transport serving the responses of a cassette directory without
+        touching the network. Every response is delayed by latency seconds
+        plus a uniformly random jitter of up to jitter seconds, drawn from a
+        generator seeded with seed so that runs are reproducible. Urls which
+        were never recorded are answered with 404.
+    """
+
+    def __init__(self, directory, latency=0, jitter=0, seed=None):
+        self.cassette = Cassette(directory)
+        self.latency = latency
+        self.jitter = jitter
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+
+    def delay(self):
+        with self._lock:
+            return self.latency + self._random.uniform(0, self.jitter)
+
+
+    def replay(self, url, headers=None):
+        """ Method for answering a request from the cassette, including
+            conditional requests matching the recorded ETag.
+        """
+        response = self.cassette.load(url)
+        if response == None:
+            return Response(url, 404, 'Not Recorded', {}, b'')
+
+        etag = response_header(response, 'ETag')
+        if not etag == None and (headers or {}).get('If-None-Match') == etag:
+            return Response(url, 304, 'Not Modified', response.headers, b'')
+        return response
+
+
+    def request(self, url, headers=None):
+        time.sleep(self.delay())
+        return self.replay(url, headers)
+
+
+class AsyncReplayTransport(ReplayTransport):
+    """ Asyncio counterpart of ReplayTransport, for default_async_session.
+    """
+
+    async def request(self, url, headers=None):
+        await asyncio.sleep(self.delay())
+        return self.replay(url, headers)
+
+
+    async def get(self, url, headers=None):
+        return checked_body(await self.request(url, headers))
+
+
+class ResponseCache(object):
+    """ Page response cache with an in-memory LRU front and an optional
+        SQLite backend. Entries expire according to the type of page, and
+        history pages for windows which have already closed never expire.
+    """
+    default_ttls = {
+        'summary': 15,
+        'statistics': 24 * 3600,
+        'profile': 24 * 3600,
+        'analysts': 24 * 3600,
+        'holdings': 24 * 3600,
+        'performance': 24 * 3600,
+        'risk': 24 * 3600,
+        'history': 15 * 60,
+    }
+
+    def __init__(self, path=None, max_entries=256, ttls=None):
+        self.max_entries = max_entries
+        self.ttls = dict(self.default_ttls)
+        self.ttls.update(ttls or {})
+
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._database = None
+        if not path == None:
+            self._database = sqlite3.connect(path, check_same_thread=False)
+            self._database.execute('CREATE TABLE IF NOT EXISTS responses (url TEXT PRIMARY KEY, fetched_at REAL, body BLOB)')
+            self._database.commit()
+
+
+    def page_type(self, url):
+        return url_page_type(url)
+
+
+    def ttl(self, url, fetched_at=None):
+        """ Method for finding how long a response fetched at time fetched_at
+            (now by default) may be cached in seconds, None meaning forever.
+        """
+        page_type = self.page_type(url)
+        if page_type == 'history':
+            # Only a window which had already closed when it was fetched is complete
+            period2 = parse_qs(urlsplit(url).query).get('period2')
+            if period2 and int(period2[0]) + 2 * 24 * 3600 < (fetched_at or time.time()):
+                return None
+        return self.ttls.get(page_type, 0)
+
+
+    def _fresh(self, url, fetched_at):
+        ttl = self.ttl(url, fetched_at)
+        return ttl == None or time.time() - fetched_at < ttl
+
+
+    def get(self, url):
+        """ Method for reading a cached response body, returning None when
+            it is missing or expired.
+        """
+        with self._lock:
+            entry = self._memory.get(url)
+            if entry == None and not self._database == None:
+                entry = self._database.execute('SELECT fetched_at, body FROM responses WHERE url = ?', (url,)).fetchone()
+                if not entry == None:
+                    entry = (entry[0], bytes(entry[1]))
+                    self._remember(url, entry)
+
+            if entry == None or not self._fresh(url, entry[0]):
+                return None
+            self._memory.move_to_end(url)
+            return entry[1]
+
+
+    def set(self, url, body):
+        """ Method for storing a response body.
+        """
+        if self.ttl(url) == 0:
+            return
+
+        entry = (time.time(), body)
+        with self._lock:
+            self._remember(url, entry)
+            if not self._database == None:
+                self._database.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?)', (url, entry[0], entry[1]))
+                self._database.commit()
+
+
+    def _remember(self, url, entry):
+        self._memory[url] = entry
+        self._memory.move_to_end(url)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if not self._database == None:
+                self._database.execute('DELETE FROM responses')
+                self._database.commit()
+
+
+class RateLimiter(object):
+    """ Token bucket limiting requests to rate per second, with bursts of up
+        to burst requests. A rate of None disables the limit.
+    """
+
+    def __init__(self, rate=None, burst=1):
+        self.rate = rate
+        self.burst = burst
+
+        self._lock = threading.Lock()
+        self._tokens = burst
+        self._updated = time.monotonic()
+
+
+    def reserve(self):
+        """ Method for taking a token, returning the seconds to wait before
+            it may be used.
+        """
+        if self.rate == None:
+            return 0
+
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0
+            return -self._tokens / self.rate
+
+
+    def acquire(self):
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+
+    async def async_acquire(self):
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class RetryPolicy(object):
+    """ Retry of failed page requests with jittered exponential backoff.
+        Connection errors and the statuses in retry_statuses are retried up
+        to retries times, waiting a random time of up to backoff * 2 **
+        attempt seconds, or the Retry-After time of a 429/503 response, but
+        never longer than max_delay seconds.
+    """
+    retry_statuses = (429, 500, 502, 503, 504)
 
-PYTHON_VERSION = sys.version_info[0]
-if PYTHON_VERSION == 3:
-    import urllib.request
-else:
-    import urllib2
+    def __init__(self, retries=3, backoff=0.5, max_delay=60):
+        self.retries = retries
+        self.backoff = backoff
+        self.max_delay = max_delay
+
+
+    def retry_after(self, response):
+        """ Method for reading the Retry-After header of a response as
+            seconds, returning None when it is missing or invalid.
+        """
+        value = response_header(response, 'Retry-After')
+        if value == None or not response.status in (429, 503):
+            return None
+        try:
+            return max(0, float(value))
+        except ValueError:
+            pass
+        try:
+            return max(0, (parsedate_to_datetime(value) - datetime.now(parsedate_to_datetime(value).tzinfo)).total_seconds())
+        except (TypeError, ValueError):
+            return None
+
+
+    def delay(self, attempt, response=None):
+        """ Method for finding the seconds to wait before retry number
+            attempt + 1.
+        """
+        wait = None if response == None else self.retry_after(response)
+        if wait == None:
+            wait = random.uniform(0, self.backoff * 2 ** attempt)
+        return min(wait, self.max_delay)
+
+
+default_session = Session()
+default_cache = None
+default_rate_limiter = RateLimiter()
+default_retry_policy = RetryPolicy()
+
+# Errors of a request which did not get a response, and may be retried
+CONNECTION_ERRORS = (http.client.HTTPException, EOFError, asyncio.TimeoutError, socket.error)
+
+
+def request_page(url, headers=None, observer=None):
+    """ Method for requesting a url through default_session, throttled by
+        default_rate_limiter and retried by default_retry_policy. The
+        callable observer, when given, is called with every response, and
+        with None for every connection error, including the retried ones.
+    """
+    attempt = 0
+    while True:
+        default_rate_limiter.acquire()
+        started = time.perf_counter()
+        try:
+            response = default_session.request(url, headers)
+        except CONNECTION_ERRORS:
+            if not observer == None:
+                observer(None)
+            if attempt >= default_retry_policy.retries:
+                raise
+            delay = default_retry_policy.delay(attempt)
+        else:
+            observe_response(url, started, response.status, response.body)
+            if not observer == None:
+                observer(response)
+            if not response.status in default_retry_policy.retry_statuses or attempt >= default_retry_policy.retries:
+                return response
+            delay = default_retry_policy.delay(attempt, response)
+
+        metrics.increment('retries', page=url_page_type(url))
+        time.sleep(delay)
+        attempt += 1
+
+
+def checked_body(response):
+    """ Method for reading the body of a response, raising HTTPError on
+        error responses.
+    """
+    if response.status >= 400:
+        raise HTTPError(response.url, response.status, response.reason, response.headers, None)
+    return response.body
+
+
+def fetch_page(url, observer=None):
+    """ Method for opening and reading urls, raising on HTTP errors. The
+        responses are passed to observer, see request_page.
+    """
+    if not default_cache == None:
+        body = default_cache.get(url)
+        if not body == None:
+            metrics.increment('cache_hits', page=url_page_type(url))
+            return body
+
+    body = checked_body(request_page(url, observer=observer))
+    if not default_cache == None:
+        default_cache.set(url, body)
+    return body
 
 
 def open_page_content(url):
     """ Method for opening and reading urls.
     """
-    if PYTHON_VERSION == 3:
+    try:
+        return fetch_page(url)
+    except HTTPError as err:
+        print('HTTP Error Code: %s' % (str(err.code)))
+
+
+class AsyncSession(object):
+    """ Asyncio counterpart of Session, speaking HTTP/1.1 over asyncio
+        streams so that many requests share one event loop thread.
+    """
+    redirect_codes = Session.redirect_codes
+
+    def __init__(self, pool_size=100, timeout=30, max_redirects=5):
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.max_redirects = max_redirects
+        self.headers = dict(DEFAULT_HEADERS)
+
+        self._loop = None
+        self._idle = {}
+        self._slots = {}
+
+
+    def _bind_loop(self):
+        # Pooled streams belong to the loop that opened them
+        loop = asyncio.get_running_loop()
+        if not loop is self._loop:
+            self.close()
+            self._loop = loop
+            self._idle = {}
+            self._slots = {}
+
+
+    async def _connect(self, scheme, host):
+        parts = urlsplit(scheme + '://' + host)
+        port = parts.port or (443 if scheme == 'https' else 80)
+        return await asyncio.wait_for(asyncio.open_connection(parts.hostname, port, ssl=True if scheme == 'https' else None), self.timeout)
+
+
+    async def _exchange(self, stream, host, path, headers):
+        reader, writer = stream
+        request_lines = ['GET %s HTTP/1.1' % path, 'Host: %s' % host]
+        for key, value in headers.items():
+            request_lines.append('%s: %s' % (key, value))
+        writer.write(('\r\n'.join(request_lines) + '\r\n\r\n').encode('latin-1'))
+        await writer.drain()
+
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError('Connection closed by server')
+        version, status, reason = (status_line.decode('latin-1').rstrip('\r\n').split(' ', 2) + [''])[:3]
+        status = int(status)
+
+        response_headers = {}
+        while True:
+            line = (await reader.readline()).decode('latin-1').rstrip('\r\n')
+            if line == '':
+                break
+            key, _, value = line.partition(':')
+            response_headers[key.strip()] = value.strip()
+
+        lower_headers = dict((key.lower(), value.lower()) for key, value in response_headers.items())
+        will_close = version == 'HTTP/1.0' or lower_headers.get('connection') == 'close'
+
+        # Compressed bodies are decompressed as they arrive
+        decoder = content_decoder(lower_headers)
+        chunks = []
+        def add_chunk(data):
+            chunks.append(data if decoder == None else decoder.decompress(data))
+
+        if status in (204, 304) or 100 <= status < 200:
+            pass
+        elif 'chunked' in lower_headers.get('transfer-encoding', ''):
+            while True:
+                size = int((await reader.readline()).split(b';')[0], 16)
+                if size == 0:
+                    while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                        pass
+                    break
+                add_chunk(await reader.readexactly(size))
+                await reader.readline()
+        elif 'content-length' in lower_headers:
+            remaining = int(lower_headers['content-length'])
+            while remaining > 0:
+                data = await reader.readexactly(min(remaining, READ_SIZE))
+                add_chunk(data)
+                remaining -= len(data)
+        else:
+            while True:
+                data = await reader.read(READ_SIZE)
+                if not data:
+                    break
+                add_chunk(data)
+            will_close = True
+
+        if not decoder == None:
+            chunks.append(decoder.flush())
+            response_headers = decoded_headers(response_headers)
+        return status, reason, response_headers, b''.join(chunks), will_close
+
+
+    async def _send(self, url, headers):
+        self._bind_loop()
+        parts = urlsplit(url)
+        key = (parts.scheme, parts.netloc)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+
+        request_headers = dict(self.headers)
+        request_headers.update(headers or {})
+
+        if not key in self._slots:
+            self._slots[key] = asyncio.Semaphore(self.pool_size)
+            self._idle[key] = []
+
+        async with self._slots[key]:
+            idle = self._idle[key]
+            reused = len(idle) > 0
+            stream = idle.pop() if reused else await self._connect(*key)
+            try:
+                try:
+                    result = await asyncio.wait_for(self._exchange(stream, parts.netloc, path, request_headers), self.timeout)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    if not reused:
+                        raise
+                    # The server closed an idle keep-alive connection, retry once on a new one
+                    stream[1].close()
+                    stream = await self._connect(*key)
+                    result = await asyncio.wait_for(self._exchange(stream, parts.netloc, path, request_headers), self.timeout)
+            except BaseException:
+                stream[1].close()
+                raise
+
+            status, reason, response_headers, body, will_close = result
+            if will_close:
+                stream[1].close()
+            else:
+                idle.append(stream)
+
+        return Response(url, status, reason, response_headers, body)
+
+
+    async def request(self, url, headers=None):
+        """ Method for sending a GET request, following redirects.
+        """
+        requested_url = url
+        for _ in range(self.max_redirects + 1):
+            response = await self._send(url, headers)
+            if not response.status in self.redirect_codes:
+                break
+
+            location = response_header(response, 'Location')
+            if location == None:
+                break
+            url = urljoin(url, location)
+
+        store_validators(requested_url, response)
+        return response
+
+
+    async def get(self, url, headers=None):
+        """ Method for reading urls, raising HTTPError on error responses.
+        """
+        return checked_body(await self.request(url, headers))
+
+
+    def close(self):
+        for streams in self._idle.values():
+            for reader, writer in streams:
+                try:
+                    writer.close()
+                except RuntimeError:
+                    # The loop of the stream is closed, shut its socket down instead
+                    try:
+                        writer.get_extra_info('socket').shutdown(socket.SHUT_RDWR)
+                    except (AttributeError, OSError):
+                        pass
+            del streams[:]
+
+
+default_async_session = AsyncSession()
+
+
+async def async_request_page(url, headers=None):
+    """ Asyncio counterpart of request_page, using default_async_session.
+    """
+    attempt = 0
+    while True:
+        await default_rate_limiter.async_acquire()
+        started = time.perf_counter()
         try:
-            return urllib.request.urlopen(url).read()
-        except urllib.error.HTTPError as err:
-            print('HTTP Error Code: %s' % (str(err.code)))
+            response = await default_async_session.request(url, headers)
+        except CONNECTION_ERRORS:
+            if attempt >= default_retry_policy.retries:
+                raise
+            delay = default_retry_policy.delay(attempt)
+        else:
+            observe_response(url, started, response.status, response.body)
+            if not response.status in default_retry_policy.retry_statuses or attempt >= default_retry_policy.retries:
+                return response
+            delay = default_retry_policy.delay(attempt, response)
+
+        metrics.increment('retries', page=url_page_type(url))
+        await asyncio.sleep(delay)
+        attempt += 1
+
+
+async def async_fetch_page(url):
+    """ Method for opening and reading urls asynchronously, raising on HTTP
+        errors.
+    """
+    if not default_cache == None:
+        body = default_cache.get(url)
+        if not body == None:
+            metrics.increment('cache_hits', page=url_page_type(url))
+            return body
+
+    body = checked_body(await async_request_page(url))
+    if not default_cache == None:
+        default_cache.set(url, body)
+    return body
+
+
+async def async_open_page_content(url):
+    """ Method for opening and reading urls asynchronously.
+    """
+    try:
+        return await async_fetch_page(url)
+    except HTTPError as err:
+        print('HTTP Error Code: %s' % (str(err.code)))
+
+
+def page_changes(url, content, response):
+    """ Method for comparing a revalidation response against the loaded
+        content, returning the new content or None when it is unchanged.
+    """
+    if response.status == 304:
+        body = content
+    elif response.status >= 400:
+        print('HTTP Error Code: %s' % (str(response.status)))
+        return None
+    else:
+        body = response.body
+
+    if not default_cache == None:
+        default_cache.set(url, body)
+    if body == content:
+        return None
+    return body
+
+
+def changed_page_content(url, content):
+    """ Method for re-reading a url with a conditional request, returning
+        the new content or None when the page is unchanged.
+    """
+    if not default_cache == None:
+        body = default_cache.get(url)
+        if not body == None:
+            return None if body == content else body
+
+    return page_changes(url, content, request_page(url, conditional_headers(url)))
+
+
+async def async_changed_page_content(url, content):
+    """ Asyncio counterpart of changed_page_content.
+    """
+    if not default_cache == None:
+        body = default_cache.get(url)
+        if not body == None:
+            return None if body == content else body
+
+    return page_changes(url, content, await async_request_page(url, conditional_headers(url)))
+
+
+def make_soup(content, page=None):
+    """ Method for parsing page content with the selected PARSER, falling
+        back to html.parser when it is not installed. Only the regions given
+        by PAGE_STRAINERS are parsed, unless they are missing from the page.
+        Content which could not be downloaded (None) parses as an empty page.
+    """
+    if content == None:
+        content = b''
+
+    strainer = PAGE_STRAINERS.get(page)
+    try:
+        soup = BeautifulSoup(content, PARSER, parse_only=strainer)
+    except FeatureNotFound:
+        soup = BeautifulSoup(content, 'html.parser', parse_only=strainer)
+
+    if not strainer == None and soup.find() == None:
+        return make_soup(content)
+    return soup
+
+
+def index_soup(soup):
+    """ Method for indexing the elements of a page by tag, attribute and
+        value in a single pass, keeping the first element like soup.find.
+    """
+    index = {}
+    for element in soup.find_all(True):
+        for attribute, value in element.attrs.items():
+            if attribute in INDEXED_ATTRIBUTES:
+                for single_value in (value if isinstance(value, list) else [value]):
+                    index.setdefault((element.name, attribute, single_value), element)
+    return index
+
+
+def index_statistics(soup_statistics):
+    """ Method for reading every key statistics table once, indexing the
+        rows by heading and by (heading, row).
+    """
+    index = {}
+    for head_section in soup_statistics.find_all('h2'):
+        heading = search_soup(head_section)
+        if heading in index:
+            continue
+
+        index[heading] = {}
+        table_section = head_section.find_next_sibling()
+        tables = table_section.find_all('table') if table_section else []
+        for table in tables:
+            table_body = table.find('tbody')
+            table_rows = table_body.find_all('tr')
+            for row in table_rows:
+                cells = row.find_all('td')
+                cell_topic = search_soup(cells[0], 'span')
+                cell_content = search_soup(cells[1])
+                if not cell_topic == None:
+                    index[heading][cell_topic] = cell_content
+                    index.setdefault((heading, cell_topic), cell_content)
+    return index
+
+
+def index_profile(soup_profile):
+    """ Method for indexing a profile page like index_soup, adding the
+        fund overview and fund operations sections of ETF profiles keyed by
+        their headings.
+    """
+    index = index_soup(soup_profile)
+    profile = soup_profile.find('div', attrs={'class' : 'W(48%) smartphone_W(100%) Fl(end)'})
+    if profile == None:
+        return index
+
+    for section in profile.find_all('div', attrs={'class' : 'Mb(25px) '}):
+        heading = search_soup(section, 'h3')
+        section_list = section.find('div')
+        if not heading in ('Fund Overview', 'Fund Operations') or heading in index or section_list == None:
+            continue
+
+        profile_results = {}
+        section_rows = section_list.find_all('div')
+        if heading == 'Fund Overview':
+            for row in section_rows:
+                row_text_start = search_soup(row, 'span', 'class', 'Fl(start)')
+                row_text_end = search_soup(row, 'span', 'class', 'Fl(end)')
+                if not row_text_start == None:
+                    profile_results[row_text_start] = row_text_end
+
+        elif len(section_rows) > 0:
+            etf_title = search_soup(section_rows[0], 'span', 'class', 'W(20%)')
+            avg_title = search_soup(section_rows[0], 'span', 'class', 'W(30%)')
+            if etf_title != None and avg_title != None:
+                for i in range(1, len(section_rows)):
+                    attributes = search_soup(section_rows[i], 'span', 'class', 'W(50%)')
+                    etf_data = search_soup(section_rows[i], 'span', 'class', 'W(20%)')
+                    avg_data = search_soup(section_rows[i], 'span', 'class', 'W(30%)')
+                    if not attributes == None:
+                        profile_results[attributes] = {}
+                        profile_results[attributes][etf_title] = etf_data
+                        profile_results[attributes][avg_title] = avg_data
+        index[heading] = profile_results
+    return index
+
+
+def index_holdings(soup_holdings):
+    """ Method for reading every holdings section once, keyed by heading,
+        and the top holdings table with its title. Returns None when the
+        page has no holdings.
+    """
+    section = soup_holdings.find('section', attrs={'class' : 'Pb(20px)'})
+    if section == None:
+        return None
+
+    index = {'sections': {}, 'top_holdings_title': None, 'top_holdings': None}
+    for part in section.find_all('div', attrs={'class' : 'W(48%)'}):
+        for part_section in part.find_all('div', attrs={'class' : 'Mb(25px)'}):
+            part_section_title = search_soup(part_section, 'h3')
+            part_section_list = part_section.find('div')
+            if part_section_title in index['sections'] or part_section_list == None:
+                continue
+
+            holdings_results = {}
+            start_row = 0
+            check_section_title = part_section.find('div', attrs={'class' : 'Fz(xs)'})
+            if check_section_title:
+                start_row = 1
+
+            part_section_contents = part_section_list.find_all('div')
+            for i in range(start_row, len(part_section_contents)):
+                span_content = part_section_contents[i].find_all('span')
+                if len(span_content) > 0:
+                    data_key = search_soup(span_content[0])
+                    data_value = search_soup(span_content[-1])
+                    if not data_key == None:
+                        holdings_results[data_key] = data_value
+            index['sections'][part_section_title] = holdings_results
+
+    bottom_part = section.find('div', attrs={'data-test' : 'top-holdings'})
+    table = bottom_part.find('table') if bottom_part else None
+    if table == None:
+        return index
+
+    table_head_cells = table.find('thead').find_all('th')
+    table_head_list = []
+    for table_head_cell in table_head_cells:
+        table_head_cell_text = search_soup(table_head_cell)
+        table_head_list.append(table_head_cell_text)
+
+    holdings_results = {}
+    table_body_rows = table.find('tbody').find_all('tr')
+    for table_body_row in table_body_rows:
+        table_body_row_cells = table_body_row.find_all('td')
+        name = search_soup(table_body_row_cells[0])
+        if not name == None:
+            holdings_results[name] = {}
+            for i in range(1, len(table_body_row_cells)):
+                symbol_asset = search_soup(table_body_row_cells[i])
+                holdings_results[name][table_head_list[i]] = symbol_asset
+
+    index['top_holdings_title'] = search_soup(bottom_part, 'span')
+    index['top_holdings'] = holdings_results
+    return index
+
+
+def index_performance(soup_performance):
+    """ Method for reading every performance section once, keyed by
+        heading. Returns None when the page has no performance data.
+    """
+    section = soup_performance.find('section', attrs={'class' : 'Pb(20px)'})
+    if section == None:
+        return None
+
+    index = {}
+    for section_part in section.find_all('div', attrs={'class' : 'Mb(25px)'}):
+        section_part_title = search_soup(section_part, 'h3')
+        section_part_list = section_part.find('div')
+        if section_part_title in index or section_part_list == None:
+            continue
+
+        performance_results = {}
+        section_part_list_titles = []
+        for section_part_list_row in section_part_list.find_all('div'):
+            if len(section_part_list_titles) == 0:
+                etf_head = search_soup(section_part_list_row, 'span', 'class', 'W(20%)')
+                category_head = search_soup(section_part_list_row, 'span', 'class', 'W(30%)')
+                section_part_list_titles.append(etf_head)
+                section_part_list_titles.append(category_head)
+            else:
+                column_1 = search_soup(section_part_list_row, 'span', 'class', 'W(50%)')
+                if column_1 == None:
+                    column_1 = search_soup(section_part_list_row, 'span', 'class', 'W(10%)')
+                column_2 = search_soup(section_part_list_row, 'span', 'class', 'W(20%)')
+                column_3 = search_soup(section_part_list_row, 'span', 'class', 'W(30%)')
+
+                if not column_1 == None:
+                    performance_results[column_1] = {}
+                    performance_results[column_1][section_part_list_titles[0]] = column_2
+                    performance_results[column_1][section_part_list_titles[1]] = column_3
+        index[section_part_title] = performance_results
+    return index
+
+
+def index_risk(soup_risk):
+    """ Method for reading the risk statistics table, returning None when
+        the page has none.
+    """
+    section = soup_risk.find('div', attrs={'class' : 'Miw(650px)'})
+    title_row = section.find('div', attrs={'class' : 'Fz(xs)'}) if section else None
+    if title_row == None:
+        return None
+
+    title_list = []
+    for cell in title_row.find_all('div', attrs={'class' : 'W(25%)'}):
+        year = search_soup(cell, 'span', 'class', 'Ta(c)')
+        current_etf = search_soup(cell, 'span', 'class', 'Fl(start)')
+        category_avg = search_soup(cell, 'span', 'class', 'Fl(end)')
+        title_list.append([year, current_etf, category_avg])
+
+    risk_results = {}
+    for section_body_row in section.find_all('div', attrs={'class' : 'H(25px)'}):
+        topic = search_soup(section_body_row, 'div', 'class', 'W(24%)')
+        if not topic == None:
+            risk_results[topic] = {}
+
+            body_contents = section_body_row.find_all('div', attrs={'class' : 'W(25%)'})
+            for i in range(min(len(body_contents), len(title_list))):
+                etf_data = search_soup(body_contents[i], 'span', 'class', 'W(39%)')
+                avg_data = search_soup(body_contents[i], 'span', 'class', 'W(57%)')
+                risk_results[topic][title_list[i][0]] = {}
+                risk_results[topic][title_list[i][0]][title_list[i][1]] = etf_data
+                risk_results[topic][title_list[i][0]][title_list[i][2]] = avg_data
+
+    return risk_results
+
+
+def index_analysts(soup_analysts):
+    """ Method for reading every analysts table once, keyed by the title
+        in its first heading cell.
+    """
+    index = {}
+    table_headings = {}
+    for table in soup_analysts.find_all('table'):
+        table_head = table.find('thead')
+        table_head_row = table_head.find('tr').find_all('th') if table_head and table_head.find('tr') else []
+        table_body = table.find('tbody')
+        if len(table_head_row) == 0 or table_body == None:
+            continue
+
+        table_title = search_soup(table_head_row[0])
+        analysts_search_result = index.setdefault(table_title, {})
+        headings = table_headings.setdefault(table_title, [])
+        for i in range(1, len(table_head_row)):
+            table_heading_content = search_soup(table_head_row[i])
+            headings.append(table_heading_content)
+
+        for table_body_row in table_body.find_all('tr'):
+            table_body_row_cell = table_body_row.find_all('td')
+            table_row_name = search_soup(table_body_row_cell[0]) if len(table_body_row_cell) > 0 else None
+            if not table_row_name == None:
+                analysts_search_result[table_row_name] = {}
+                for j in range(1, len(table_body_row_cell)):
+                    table_row_cell = search_soup(table_body_row_cell[j])
+                    analysts_search_result[table_row_name][headings[j-1]] = table_row_cell
+    return index
+
+
+PAGE_INDEXERS = {
+    'statistics': index_statistics,
+    'profile': index_profile,
+    'holdings': index_holdings,
+    'performance': index_performance,
+    'risk': index_risk,
+    'analysts': index_analysts,
+}
+
+
+# Assignment of the data model which Yahoo embeds in a script of its pages
+PAGE_DATA_MARKER = b'root.App.main = '
+
+
+def find_page_data(content):
+    """ Method for decoding the data model embedded in a page, scanning the
+        raw content for its assignment instead of parsing the page. Returns
+        the QuoteSummaryStore of the page, or {} when it is missing.
+    """
+    if not content:
+        return {}
+    start = content.find(PAGE_DATA_MARKER)
+    if start < 0:
+        return {}
+
+    try:
+        data, _ = json.JSONDecoder().raw_decode(content[start + len(PAGE_DATA_MARKER):].decode('utf-8'))
+        return data['context']['dispatcher']['stores'].get('QuoteSummaryStore') or {}
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return {}
+
+
+def signed(value):
+    return value if value.startswith(('-', '+')) else '+' + value
+
+
+def thousands(value):
+    return '{:,}'.format(value)
+
+
+def market_time(timestamp, offset):
+    """ Method for formatting a trade timestamp as the local time of its
+        exchange, given the UTC offset in milliseconds, e.g. '4:00PM'.
+    """
+    return datetime.fromtimestamp(timestamp + offset // 1000, timezone.utc).strftime('%I:%M%p').lstrip('0')
+
+
+# Getter fields which are read from the embedded page data before falling
+# back to the page DOM, as (template, paths). Each path is looked up in the
+# QuoteSummaryStore, and the values are formatted like the text of the DOM
+# by the template, which is a format string or a function. Values which the
+# page leaves empty ({}) read as 'N/A', like the DOM.
+PAGE_DATA_FIELDS = {
+    'summary': {
+        'stock_exchange': ('%s', ('price.exchangeName',)),
+        'currency': ('%s', ('price.currency',)),
+        'price': ('%s', ('price.regularMarketPrice.fmt',)),
+        'change': (signed, ('price.regularMarketChange.fmt',)),
+        'percent_change': (signed, ('price.regularMarketChangePercent.fmt',)),
+        'previous_trade_time': (market_time, ('price.regularMarketTime', 'quoteType.gmtOffSetMilliseconds')),
+        'trade_timezone': ('%s', ('quoteType.exchangeTimezoneShortName',)),
+        'previous_close': ('%s', ('summaryDetail.previousClose.fmt',)),
+        'open': ('%s', ('summaryDetail.open.fmt',)),
+        'bid': ('%s x %s', ('summaryDetail.bid.fmt', 'summaryDetail.bidSize.raw')),
+        'ask': ('%s x %s', ('summaryDetail.ask.fmt', 'summaryDetail.askSize.raw')),
+        'day_range': ('%s - %s', ('summaryDetail.dayLow.fmt', 'summaryDetail.dayHigh.fmt')),
+        '52_week_range': ('%s - %s', ('summaryDetail.fiftyTwoWeekLow.fmt', 'summaryDetail.fiftyTwoWeekHigh.fmt')),
+        'volume': ('%s', ('summaryDetail.volume.longFmt',)),
+        'avg_daily_volume': ('%s', ('summaryDetail.averageVolume.longFmt',)),
+        'net_assets': ('%s', ('summaryDetail.totalAssets.fmt',)),
+        'nav': ('%s', ('summaryDetail.navPrice.fmt',)),
+        'pe_ratio': ('%s', ('summaryDetail.trailingPE.fmt',)),
+        'yield': ('%s', ('summaryDetail.yield.fmt',)),
+        'ytd_return': ('%s', ('summaryDetail.ytdReturn.fmt',)),
+        'beta_3y': ('%s', ('defaultKeyStatistics.beta3Year.fmt',)),
+        'expense_ratio': ('%s', ('defaultKeyStatistics.annualReportExpenseRatio.fmt',)),
+        'inception_date': ('%s', ('defaultKeyStatistics.fundInceptionDate.fmt',)),
+    },
+    # Keyed by the (heading, row name) of the key statistics tables
+    'statistics': {
+        ('Valuation Measures', 'Market Cap (intraday)'): ('%s', ('summaryDetail.marketCap.fmt',)),
+        ('Valuation Measures', 'Enterprise Value'): ('%s', ('defaultKeyStatistics.enterpriseValue.fmt',)),
+        ('Valuation Measures', 'Trailing P/E'): ('%s', ('summaryDetail.trailingPE.fmt',)),
+        ('Valuation Measures', 'Forward P/E'): ('%s', ('defaultKeyStatistics.forwardPE.fmt',)),
+        ('Valuation Measures', 'PEG Ratio (5 yr expected)'): ('%s', ('defaultKeyStatistics.pegRatio.fmt',)),
+        ('Valuation Measures', 'Price/Sales'): ('%s', ('summaryDetail.priceToSalesTrailing12Months.fmt',)),
+        ('Valuation Measures', 'Price/Book'): ('%s', ('defaultKeyStatistics.priceToBook.fmt',)),
+        ('Valuation Measures', 'Enterprise Value/Revenue'): ('%s', ('defaultKeyStatistics.enterpriseToRevenue.fmt',)),
+        ('Valuation Measures', 'Enterprise Value/EBITDA'): ('%s', ('defaultKeyStatistics.enterpriseToEbitda.fmt',)),
+        ('Financial Highlights', 'Fiscal Year Ends'): ('%s', ('defaultKeyStatistics.lastFiscalYearEnd.fmt',)),
+        ('Financial Highlights', 'Most Recent Quarter'): ('%s', ('defaultKeyStatistics.mostRecentQuarter.fmt',)),
+        ('Financial Highlights', 'Profit Margin'): ('%s', ('financialData.profitMargins.fmt',)),
+        ('Financial Highlights', 'Operating Margin'): ('%s', ('financialData.operatingMargins.fmt',)),
+        ('Financial Highlights', 'Return on Assets'): ('%s', ('financialData.returnOnAssets.fmt',)),
+        ('Financial Highlights', 'Return on Equity'): ('%s', ('financialData.returnOnEquity.fmt',)),
+        ('Financial Highlights', 'Revenue'): ('%s', ('financialData.totalRevenue.fmt',)),
+        ('Financial Highlights', 'Revenue Per Share'): ('%s', ('financialData.revenuePerShare.fmt',)),
+        ('Financial Highlights', 'Quarterly Revenue Growth'): ('%s', ('financialData.revenueGrowth.fmt',)),
+        ('Financial Highlights', 'Gross Profit'): ('%s', ('financialData.grossProfits.fmt',)),
+        ('Financial Highlights', 'EBITDA'): ('%s', ('financialData.ebitda.fmt',)),
+        ('Financial Highlights', 'Net Income Avi to Common'): ('%s', ('defaultKeyStatistics.netIncomeToCommon.fmt',)),
+        ('Financial Highlights', 'Diluted EPS'): ('%s', ('defaultKeyStatistics.trailingEps.fmt',)),
+        ('Financial Highlights', 'Quarterly Earnings Growth'): ('%s', ('defaultKeyStatistics.earningsQuarterlyGrowth.fmt',)),
+        ('Financial Highlights', 'Total Cash'): ('%s', ('financialData.totalCash.fmt',)),
+        ('Financial Highlights', 'Total Cash Per Share'): ('%s', ('financialData.totalCashPerShare.fmt',)),
+        ('Financial Highlights', 'Total Debt'): ('%s', ('financialData.totalDebt.fmt',)),
+        ('Financial Highlights', 'Total Debt/Equity'): ('%s', ('financialData.debtToEquity.fmt',)),
+        ('Financial Highlights', 'Current Ratio'): ('%s', ('financialData.currentRatio.fmt',)),
+        ('Financial Highlights', 'Book Value Per Share'): ('%s', ('defaultKeyStatistics.bookValue.fmt',)),
+        ('Financial Highlights', 'Operating Cash Flow'): ('%s', ('financialData.operatingCashflow.fmt',)),
+        ('Financial Highlights', 'Levered Free Cash Flow'): ('%s', ('financialData.freeCashflow.fmt',)),
+        ('Trading Information', 'Beta'): ('%s', ('defaultKeyStatistics.beta.fmt',)),
+        ('Trading Information', '52-Week Change'): ('%s', ('defaultKeyStatistics.52WeekChange.fmt',)),
+        ('Trading Information', 'S&P500 52-Week Change'): ('%s', ('defaultKeyStatistics.SandP52WeekChange.fmt',)),
+        ('Trading Information', '52 Week High'): ('%s', ('summaryDetail.fiftyTwoWeekHigh.fmt',)),
+        ('Trading Information', '52 Week Low'): ('%s', ('summaryDetail.fiftyTwoWeekLow.fmt',)),
+        ('Trading Information', '50-Day Moving Average'): ('%s', ('summaryDetail.fiftyDayAverage.fmt',)),
+        ('Trading Information', '200-Day Moving Average'): ('%s', ('summaryDetail.twoHundredDayAverage.fmt',)),
+        ('Trading Information', 'Avg Vol (3 month)'): ('%s', ('summaryDetail.averageVolume.fmt',)),
+        ('Trading Information', 'Avg Vol (10 day)'): ('%s', ('summaryDetail.averageVolume10days.fmt',)),
+        ('Trading Information', 'Shares Outstanding'): ('%s', ('defaultKeyStatistics.sharesOutstanding.fmt',)),
+        ('Trading Information', 'Float'): ('%s', ('defaultKeyStatistics.floatShares.fmt',)),
+        ('Trading Information', '% Held by Insiders'): ('%s', ('defaultKeyStatistics.heldPercentInsiders.fmt',)),
+        ('Trading Information', '% Held by Institutions'): ('%s', ('defaultKeyStatistics.heldPercentInstitutions.fmt',)),
+        ('Trading Information', 'Shares Short'): ('%s', ('defaultKeyStatistics.sharesShort.fmt',)),
+        ('Trading Information', 'Short Ratio'): ('%s', ('defaultKeyStatistics.shortRatio.fmt',)),
+        ('Trading Information', 'Short % of Float'): ('%s', ('defaultKeyStatistics.shortPercentOfFloat.fmt',)),
+        ('Trading Information', 'Shares Short (prior month)'): ('%s', ('defaultKeyStatistics.sharesShortPriorMonth.fmt',)),
+        ('Trading Information', 'Forward Annual Dividend Rate'): ('%s', ('summaryDetail.dividendRate.fmt',)),
+        ('Trading Information', 'Forward Annual Dividend Yield'): ('%s', ('summaryDetail.dividendYield.fmt',)),
+        ('Trading Information', 'Trailing Annual Dividend Rate'): ('%s', ('summaryDetail.trailingAnnualDividendRate.fmt',)),
+        ('Trading Information', 'Trailing Annual Dividend Yield'): ('%s', ('summaryDetail.trailingAnnualDividendYield.fmt',)),
+        ('Trading Information', '5 Year Average Dividend Yield'): ('%s', ('summaryDetail.fiveYearAvgDividendYield.fmt',)),
+        ('Trading Information', 'Payout Ratio'): ('%s', ('summaryDetail.payoutRatio.fmt',)),
+        ('Trading Information', 'Dividend Date'): ('%s', ('calendarEvents.dividendDate.fmt',)),
+        ('Trading Information', 'Ex-Dividend Date'): ('%s', ('summaryDetail.exDividendDate.fmt',)),
+        ('Trading Information', 'Last Split Factor (new per old)'): ('%s', ('defaultKeyStatistics.lastSplitFactor',)),
+        ('Trading Information', 'Last Split Date'): ('%s', ('defaultKeyStatistics.lastSplitDate.fmt',)),
+    },
+    'profile': {
+        'company_name': ('%s', ('price.longName',)),
+        'company_phone_number': ('%s', ('assetProfile.phone',)),
+        'company_website': ('%s', ('assetProfile.website',)),
+        'sector': ('%s', ('assetProfile.sector',)),
+        'industry': ('%s', ('assetProfile.industry',)),
+        'number_of_full_time_employees': (thousands, ('assetProfile.fullTimeEmployees',)),
+    },
+}
+
+
+def data_value(data, path, empty=None):
+    """ Method for looking up a dotted path in the embedded page data,
+        returning None when it is missing and empty when the page left its
+        value empty.
+    """
+    keys = path.split('.')
+    for depth, key in enumerate(keys):
+        if not isinstance(data, dict):
+            return None
+        if data == {} and depth > 1:
+            return empty
+        data = data.get(key)
+    if data in ({}, ''):
+        return empty
+    return data
+
+
+def page_data_field(data, page, field):
+    """ Method for reading a getter field from the embedded page data,
+        formatted like the text of the page DOM.
+    """
+    template, paths = PAGE_DATA_FIELDS[page][field]
+    values = tuple(data_value(data, path, 'N/A') for path in paths)
+    if None in values:
+        return None
+    if callable(template):
+        return 'N/A' if 'N/A' in values else template(*values)
+    return template % values
+
+
+def lazy_page_attribute(instance, name):
+    """ Method for downloading, parsing and indexing a page the first time
+        one of its content_*, soup_* or index_* attributes is accessed.
+    """
+    prefix, _, page = name.partition('_')
+    if prefix not in PAGE_ATTRIBUTES or page not in instance.pages:
+        raise AttributeError(name)
+
+    loading = metrics.loading()
+    started = time.perf_counter()
+    if prefix == 'content':
+        value = None
+        if not page in instance.failed_pages:
+            value = open_page_content(getattr(instance, 'url_' + page))
+            if value == None:
+                instance.fail_page(page)
+    elif prefix == 'data':
+        value = find_page_data(getattr(instance, 'content_' + page))
+    elif prefix == 'soup':
+        content = getattr(instance, 'content_' + page)
+        parse_started = time.perf_counter()
+        value = make_soup(content, page)
+        metrics.observe('parse_seconds', time.perf_counter() - parse_started, page=page)
     else:
+        soup = getattr(instance, 'soup_' + page)
+        index_started = time.perf_counter()
+        value = PAGE_INDEXERS.get(page, index_soup)(soup)
+        metrics.observe('index_seconds', time.perf_counter() - index_started, page=page)
+
+    # A page which failed to download is read as an empty page until it is
+    # retried, see Quote.retry_pages
+    if prefix == 'content':
+        keep = not value == None
+    else:
+        keep = 'content_' + page in instance.__dict__ or page in instance.failed_pages
+    if keep:
+        setattr(instance, name, value)
+
+    # Nested page loads have already been added
+    metrics.add_loading(time.perf_counter() - started - (metrics.loading() - loading))
+    return value
+
+
+def timed_getter(getter, quote_name):
+    """ Method for wrapping a getter to record its time in the metrics,
+        leaving out the time spent loading pages.
+    """
+    @functools.wraps(getter)
+    def wrapper(self, *args, **kwargs):
+        if not metrics.enabled:
+            return getter(self, *args, **kwargs)
+
+        loading = metrics.loading()
+        started = time.perf_counter()
+        value = getter(self, *args, **kwargs)
+        elapsed = time.perf_counter() - started - (metrics.loading() - loading)
+        metrics.observe('getter_seconds', elapsed, quote=quote_name, getter=getter.__name__)
+        return value
+    return wrapper
+
+
+def search_index(index, tag, attribute, value):
+    """ Method for finding specific web element text in a page index.
+    """
+    element = index.get((tag, attribute, value))
+    if element == None:
+        return None
+    return element.getText()
+
+
+MAGNITUDES = {'K': 10 ** 3, 'M': 10 ** 6, 'B': 10 ** 9, 'T': 10 ** 12}
+NUMBER_PATTERN = re.compile(r'^([+-]?[\d,]*\.?\d+)([KkMBT%]?)$')
+DATE_FORMATS = ('%b %d, %Y', '%b %d %Y', '%Y-%m-%d')
+
+
+def search_index_word(index, tag, attribute, value, position, strip=None):
+    """ Method for finding one space separated word of a web element text
+        in a page index, stripped of the strip characters, or None when the
+        element or the word is missing.
+    """
+    text = search_index(index, tag, attribute, value)
+    if text == None:
+        return None
+    words = text.split(' ')
+    if not -len(words) <= position < len(words):
+        return None
+    return words[position].strip(strip) if strip else words[position]
+
+
+def parse_value(value):
+    """ Method for converting scraped text into a typed value. Numbers keep
+        their K/k/M/B/T magnitude, percentages become fractions, 'a - b'
+        ranges and 'a x b' bid/ask sizes become tuples, dates become
+        datetime.date and 'N/A' becomes None. Other text is returned
+        unchanged, and dicts and lists are converted value by value.
+    """
+    if isinstance(value, dict):
+        return dict((key, parse_value(item)) for key, item in value.items())
+    if isinstance(value, list):
+        return [parse_value(item) for item in value]
+    if not isinstance(value, str):
+        return value
+
+    text = value.strip()
+    if text in ('', '-', 'N/A'):
+        return None
+
+    match = NUMBER_PATTERN.match(text)
+    if match:
+        number, suffix = match.groups()
+        number = number.replace(',', '')
+        if suffix == '%':
+            return float(number) / 100
+        elif suffix:
+            return float(number) * MAGNITUDES[suffix.upper()]
+        elif '.' in number:
+            return float(number)
+        return int(number)
+
+    for separator in (' - ', ' x '):
+        parts = text.split(separator)
+        if len(parts) == 2:
+            pair = (parse_value(parts[0]), parse_value(parts[1]))
+            if all(isinstance(part, (int, float)) for part in pair):
+                return pair
+
+    for date_format in DATE_FORMATS:
         try:
-            return urllib2.urlopen(url).read()
-        except urllib2.HTTPError as err:
-            print('HTTP Error Code: %s' % (str(err.code)))
+            return datetime.strptime(text, date_format).date()
+        except ValueError:
+            pass
+    return text
 
 
 def search_soup(soup, tag=None, attribute=None, value=None):
@@ -51,355 +1769,767 @@ def search_soup(soup, tag=None, attribute=None, value=None):
         return None
 
 
-def time_setup(date, timezone):
-    """ Method for setting time offset according to timezone.
-    """
-    time_offset = ''
-    if timezone == 'EST' or timezone == 'EDT':
-        time_offset = 5
-    elif timezone == 'BRT' or timezone == 'BRST':
-        time_offset = 3
-    elif timezone == 'GMT' or timezone == 'BST':
-        time_offset = 0
-    elif timezone == 'CET' or timezone == 'CEST':
-        time_offset = -1
-    elif timezone == 'SAST' or timezone == 'EEST':
-        time_offset = -2
-    elif timezone == 'IST':
-        time_offset = -5.5
-    elif timezone == 'CST':
-        time_offset = -8
-    elif timezone == 'JST':
-        time_offset = -9
-    elif timezone == 'AEST' or timezone == 'AEDT':
-        time_offset = -10
-    else:
-        time_offset = 0
+# Exchange timezone abbreviations shown on the summary page, with the
+# fixed UTC offsets (hours) used when zoneinfo has no data for the zone
+TIMEZONES = {
+    'EST': ('America/New_York', -5), 'EDT': ('America/New_York', -5),
+    'BRT': ('America/Sao_Paulo', -3), 'BRST': ('America/Sao_Paulo', -3),
+    'GMT': ('Europe/London', 0), 'BST': ('Europe/London', 0),
+    'CET': ('Europe/Paris', 1), 'CEST': ('Europe/Paris', 1),
+    'SAST': ('Africa/Johannesburg', 2), 'EEST': ('Europe/Athens', 2),
+    'IST': ('Asia/Kolkata', 5.5),
+    'CST': ('Asia/Shanghai', 8),
+    'JST': ('Asia/Tokyo', 9),
+    'AEST': ('Australia/Sydney', 10), 'AEDT': ('Australia/Sydney', 10),
+}
 
-    return datetime.strptime(date, '%Y-%m-%d') + timedelta(hours=time_offset)
+EPOCH_ORDINAL = datetime(1970, 1, 1).toordinal()
+SECONDS_PER_DAY = 24 * 3600
 
+# Trade timezone of each ticker, read once from its summary page
+ticker_timezones = {}
 
-def historical_data(url_summary, soup_summary, from_date, to_date=None, day_range=None):
-    """ Method for getting historical data for stocks/ETFs by specific
-        dates or over a range of dates.
+
+@functools.lru_cache(maxsize=None)
+def zone_info(name):
+    if ZoneInfo == None:
+        return None
+    try:
+        return ZoneInfo(name)
+    except (KeyError, ValueError):
+        return None
+
+
+@functools.lru_cache(maxsize=4096)
+def utc_offset(timezone, ordinal):
+    """ Method for finding the UTC offset in seconds of a timezone at local
+        midnight of a day, following daylight saving time when zoneinfo has
+        data for the zone.
     """
-    timezone = search_soup(soup_summary, 'div', 'id', 'quote-market-notice').split(' ')[4].replace('.', '')
-    from_date = time_setup(from_date, timezone)
-    if not to_date == None:
-        to_date = time_setup(to_date, timezone)
+    name, fixed_offset = TIMEZONES.get(timezone, (None, 0))
+    zone = zone_info(name) if name else None
+    if zone == None:
+        return int(fixed_offset * 3600)
+    return int(datetime.fromordinal(ordinal).replace(tzinfo=zone).utcoffset().total_seconds())
 
-    urls = []
+
+def date_ordinal(date):
+    """ Method for converting a 'YYYY-MM-DD' date into a day ordinal.
+    """
+    year, month, day = date.split('-')
+    return datetime(int(year), int(month), int(day)).toordinal()
+
+
+def timestamp_setup(date, timezone):
+    """ Method for finding the UTC timestamp of local midnight of a
+        'YYYY-MM-DD' date in the given exchange timezone.
+    """
+    ordinal = date_ordinal(date)
+    return (ordinal - EPOCH_ORDINAL) * SECONDS_PER_DAY - utc_offset(timezone, ordinal)
+
+
+def historical_timezone(index_summary):
+    """ Method for finding the trade timezone on the summary page.
+    """
+    return search_index_word(index_summary, 'div', 'id', 'quote-market-notice', 4, '.')
+
+
+def history_url(url_summary, timestamp_from, timestamp_to):
+    return url_summary + "/history?period1=" + str(timestamp_from) + "&period2=" + str(timestamp_to) + "&interval=1d&filter=history&frequency=1d"
+
+
+def historical_urls(url_summary, timezone, from_date, to_date=None, day_range=None):
+    """ Method for building the history page urls covering specific dates
+        or a range of dates.
+    """
+    timestamp_from = timestamp_setup(from_date, timezone)
     if to_date == None:
-        timestamp = int(calendar.timegm(from_date.timetuple()))
-        url = url_summary + "/history?period1=" + str(timestamp) + "&period2=" + str(timestamp) + "&interval=1d&filter=history&frequency=1d"
-        urls.append(url)
-    elif to_date and day_range == 'days':
-        timestamp_from = int(calendar.timegm(from_date.timetuple()))
-        url_from = url_summary + "/history?period1=" + str(timestamp_from) + "&period2=" + str(timestamp_from) + "&interval=1d&filter=history&frequency=1d"
-        urls.append(url_from)
-
-        timestamp_to = int(calendar.timegm(to_date.timetuple()))
-        url_to = url_summary + "/history?period1=" + str(timestamp_to) + "&period2=" + str(timestamp_to) + "&interval=1d&filter=history&frequency=1d"
-        urls.append(url_to)
-    elif to_date and day_range == 'range':
-        difference = int((to_date - from_date).days)
-        
+        return [history_url(url_summary, timestamp_from, timestamp_from)]
+
+    timestamp_to = timestamp_setup(to_date, timezone)
+    urls = []
+    if day_range == 'days':
+        urls.append(history_url(url_summary, timestamp_from, timestamp_from))
+        urls.append(history_url(url_summary, timestamp_to, timestamp_to))
+    elif day_range == 'range':
+        difference = date_ordinal(to_date) - date_ordinal(from_date)
+
         days_per_run = 120
-        number_of_runs = math.ceil(difference / days_per_run)
+        number_of_runs = -(-difference // days_per_run)
 
         for i in range(number_of_runs):
-            start_at = days_per_run * i
-            end_at   = days_per_run * (i+1)
+            start_at = timestamp_from + days_per_run * i * SECONDS_PER_DAY
+            end_at = min(timestamp_from + days_per_run * (i+1) * SECONDS_PER_DAY, timestamp_to)
+            urls.append(history_url(url_summary, start_at, end_at))
 
-            start_date = from_date + timedelta(days=start_at)
-            end_date   = from_date + timedelta(days=end_at)
-            if end_date > to_date:
-                end_date = to_date
-            
-            timestamp_from = int(calendar.timegm(start_date.timetuple()))
-            timestamp_to = int(calendar.timegm(end_date.timetuple()))
-            url = url_summary + "/history?period1=" + str(timestamp_from) + "&period2=" + str(timestamp_to) + "&interval=1d&filter=history&frequency=1d"
-            urls.append(url)
+    return urls
 
-    historic_result = []
-    for url in urls:
-        content_history = open_page_content(url)
-        soup_history = BeautifulSoup(content_history, 'html.parser')
 
-        table = soup_history.find('table', attrs={'class': 'W(100%)'})
-        table_head = table.find('thead')
-        table_head_row = table_head.find_all('th')
-        
-        table_headings = []
-        for cell in table_head_row:
-            cell_text = search_soup(cell).replace('*', '')
-            table_headings.append(cell_text)
+def parse_historical_page(content_history):
+    """ Method for parsing the rows of a history page.
+    """
+    soup_history = make_soup(content_history, 'history')
+
+    table = soup_history.find('table', attrs={'class': 'W(100%)'})
+    if table == None:
+        return []
+    table_head = table.find('thead')
+    table_head_row = table_head.find_all('th')
+    
+    table_headings = []
+    for cell in table_head_row:
+        cell_text = search_soup(cell).replace('*', '')
+        table_headings.append(cell_text)
+
+    table_body = table.find('tbody')
+    table_rows = table_body.find_all('tr')
+    
+    historic_rows = []
+    for row in table_rows:
+        cols = row.find_all('td')
+        current_row = {}
+        if len(cols) != 2:
+            for i in range(len(cols)):
+                cols_cell_text = search_soup(cols[i]).replace(',', '')
+                current_row[table_headings[i]] = cols_cell_text
 
-        table_body = table.find('tbody')
-        table_rows = table_body.find_all('tr')
-        
-        for row in table_rows:
-            cols = row.find_all('td')
-            current_row = {}
-            if len(cols) != 2:
-                for i in range(len(cols)):
-                    cols_cell_text = search_soup(cols[i]).replace(',', '')
-                    current_row[table_headings[i]] = cols_cell_text
-
-                if not any(current_row[table_headings[0]] == cols[0] for current_row in historic_result) and \
-                    not all(current_row[table_headings[i]] == '-' for i in range(1, len(current_row))):
-                    historic_result.append(current_row)
-            else:
-                current_row_date = search_soup(cols[0]).replace(',', '')
-                current_row['Date'] = current_row_date
-                current_row_dividend = search_soup(cols[1]).replace(',', '')
-                current_row['Dividend'] = current_row_dividend
-                historic_result.append(current_row)
+            if not all(current_row[table_headings[i]] == '-' for i in range(1, len(current_row))):
+                historic_rows.append(current_row)
+        else:
+            current_row_date = search_soup(cols[0]).replace(',', '')
+            current_row['Date'] = current_row_date
+            current_row_dividend = search_soup(cols[1]).replace(',', '')
+            current_row['Dividend'] = current_row_dividend
+            historic_rows.append(current_row)
+
+    return historic_rows
+
+
+def chart_url(url_summary, timestamp_from, timestamp_to):
+    ticker = url_summary.rsplit('/', 1)[-1]
+    return CHART_URL + ticker + "?period1=" + str(timestamp_from) + "&period2=" + str(timestamp_to) + "&interval=1d&events=div%7Csplit"
 
+
+def chart_requests(url_summary, timezone, from_date, to_date=None, day_range=None):
+    """ Method for building the chart urls covering specific dates or a
+        range of dates, as (url, first, last) with the day ordinals of the
+        dates each url is read for. A range is one request, not windows.
+    """
+    windows = [(from_date, from_date)]
+    if day_range == 'days':
+        windows.append((to_date, to_date))
+    elif day_range == 'range':
+        windows = [(from_date, to_date)]
+
+    requests = []
+    for first, last in windows:
+        url = chart_url(url_summary, timestamp_setup(first, timezone), timestamp_setup(last, timezone) + SECONDS_PER_DAY)
+        requests.append((url, date_ordinal(first), date_ordinal(last)))
+    return requests
+
+
+@functools.lru_cache(maxsize=4096)
+def history_date(ordinal):
+    """ Method for formatting a day ordinal like the dates of the history
+        page, e.g. 'Mar 23 2018'.
+    """
+    date = datetime.fromordinal(ordinal)
+    return '%s %02d %d' % (MONTH_NAMES[date.month - 1], date.day, date.year)
+
+
+def chart_price(value):
+    return '-' if value == None else '%.2f' % value
+
+
+def parse_chart_data(content_chart, first, last):
+    """ Method for parsing the rows of a chart response between two day
+        ordinals into the rows of the history page, newest first. Days are
+        the exchange dates of the timestamps, using the gmtoffset of the
+        chart.
+    """
+    try:
+        result = json.loads(content_chart)['chart']['result'][0]
+    except (ValueError, KeyError, IndexError, TypeError):
+        return []
+
+    offset = result['meta'].get('gmtoffset', 0)
+    timestamps = result.get('timestamp') or []
+    indicators = result.get('indicators', {})
+    quote = indicators.get('quote', [{}])[0]
+    adjclose = indicators.get('adjclose', [{}])[0].get('adjclose') or quote.get('close')
+
+    missing = [None] * len(timestamps)
+    columns = [quote.get('open') or missing, quote.get('high') or missing, quote.get('low') or missing,
+               quote.get('close') or missing, adjclose or missing, quote.get('volume') or missing]
+
+    dated_rows = []
+    for timestamp, values in zip(timestamps, zip(*columns)):
+        day = (timestamp + offset) // SECONDS_PER_DAY + EPOCH_ORDINAL
+        if first <= day <= last and not all(value == None for value in values):
+            open_, high, low, close, adjusted, volume = values
+            dated_rows.append((day, 0, {
+                'Date': history_date(day),
+                'Open': chart_price(open_),
+                'High': chart_price(high),
+                'Low': chart_price(low),
+                'Close': chart_price(close),
+                'Adj Close': chart_price(adjusted),
+                'Volume': '-' if volume == None else str(volume),
+            }))
+
+    events = result.get('events', {})
+    for dividend in events.get('dividends', {}).values():
+        day = (dividend['date'] + offset) // SECONDS_PER_DAY + EPOCH_ORDINAL
+        if first <= day <= last:
+            dated_rows.append((day, 1, {'Date': history_date(day), 'Dividend': '%g Dividend' % dividend['amount']}))
+    for split in events.get('splits', {}).values():
+        day = (split['date'] + offset) // SECONDS_PER_DAY + EPOCH_ORDINAL
+        if first <= day <= last:
+            dated_rows.append((day, 1, {'Date': history_date(day), 'Dividend': '%g/%g Stock Split' % (split['numerator'], split['denominator'])}))
+
+    dated_rows.sort(key=lambda dated_row: dated_row[:2], reverse=True)
+    return [row for day, event, row in dated_rows]
+
+
+def historical_requests(url_summary, timezone, from_date, to_date=None, day_range=None, backend=None):
+    """ Method for building the requests of a history backend as (url,
+        parse) pairs, where parse turns the content of the url into rows.
+        The 'html' backend scrapes the history pages in 120 day windows, the
+        'chart' backend reads the chart data of Yahoo's chart endpoint
+        (CHART_URL) in one request per range.
+    """
+    backend = backend or HISTORY_BACKEND
+    if backend == 'html':
+        return [(url, parse_historical_page) for url in historical_urls(url_summary, timezone, from_date, to_date, day_range)]
+    if backend == 'chart':
+        return [(url, functools.partial(parse_chart_data, first=first, last=last)) for url, first, last in chart_requests(url_summary, timezone, from_date, to_date, day_range)]
+    raise ValueError('unknown history backend %r' % backend)
+
+
+def merge_historical_rows(historic_result, historic_rows):
+    """ Method for adding history rows to a date keyed accumulator, skipping
+        rows already added from an overlapping window. Price and event rows
+        of the same date are kept apart.
+    """
+    for row in historic_rows:
+        historic_result.setdefault(historical_key(row), row)
+    return historic_result
+
+
+def historical_key(row):
+    """ Method for keying a history row by date, keeping price, dividend
+        and split rows of the same date apart by their event text.
+    """
+    return (row['Date'], row.get('Dividend'))
+
+
+def ordered_chunk_rows(historic_rows, previous_keys):
+    """ Method for ordering the rows of one history page by date, dropping
+        the rows already yielded from the previous, overlapping window.
+        Returns the rows and the keys of every row of the page, which the
+        next window is compared against.
+    """
+    keys = set()
+    ordered_rows = []
+    for row in reversed(historic_rows):
+        key = historical_key(row)
+        if not key in previous_keys and not key in keys:
+            ordered_rows.append(row)
+        keys.add(key)
+    return ordered_rows, keys
+
+
+def historical_date(row):
+    """ Method for reading the date of a history row as an ISO date, which
+        orders like the date without parsing it.
+    """
+    return iso_date(row['Date'])
+
+
+def combine_historical_chunks(historic_chunks, day_range=None):
+    """ Method for combining the parsed history pages. Range results are
+        ordered by date with a merge of the chunks, which Yahoo lists newest
+        first, instead of sorting all rows.
+    """
+    historic_result = OrderedDict()
     if day_range == 'range':
-        historic_result = sorted(historic_result, key = lambda x : datetime.strptime(x['Date'], '%b %d %Y'))
+        ordered_rows = heapq.merge(*[reversed(chunk) for chunk in historic_chunks], key=historical_date)
+        merge_historical_rows(historic_result, ordered_rows)
+    else:
+        for chunk in historic_chunks:
+            merge_historical_rows(historic_result, chunk)
+
+    return list(historic_result.values())
+
+
+MONTHS = {
+    'Jan': '01', 'Feb': '02', 'Mar': '03', 'Apr': '04', 'May': '05', 'Jun': '06',
+    'Jul': '07', 'Aug': '08', 'Sep': '09', 'Oct': '10', 'Nov': '11', 'Dec': '12',
+}
+MONTH_NAMES = sorted(MONTHS, key=MONTHS.get)
+
+
+def iso_date(date):
+    """ Method for converting a 'Mar 23 2018' date into '2018-03-23'.
+    """
+    month, day, year = date.split(' ')
+    return year + '-' + MONTHS[month] + '-' + day.zfill(2)
+
+
+def numpy_dates(dates):
+    """ Method for converting 'Mar 23 2018' dates into a datetime64 array.
+    """
+    return numpy.array([iso_date(date) for date in dates], dtype='datetime64[D]')
 
+
+def numpy_numbers(values, dtype, missing):
+    """ Method for converting number strings into a numpy array, with '-'
+        cells replaced by missing.
+    """
+    return numpy.array([missing if value == '-' else value for value in values]).astype(dtype)
+
+
+def split_ratio(text):
+    """ Method for converting a '2/1 Stock Split' event into its ratio.
+    """
+    new, old = re.split('[/:]', text.split(' ')[0])
+    return float(new) / float(old)
+
+
+def historical_columns(historic_result):
+    """ Method for converting history rows into numpy columns: dates as
+        datetime64, prices as float64 (NaN when missing) and volume as int64,
+        with dividend and split events as separate arrays.
+    """
+    if numpy == None:
+        raise ImportError('numpy is required for columnar historical data')
+
+    prices = [row for row in historic_result if not 'Dividend' in row]
+    dividends = [row for row in historic_result if 'Dividend' in row and not 'Split' in row['Dividend']]
+    splits = [row for row in historic_result if 'Dividend' in row and 'Split' in row['Dividend']]
+
+    columns = {'Date': numpy_dates([row['Date'] for row in prices])}
+    headings = ['Open', 'High', 'Low', 'Close', 'Adj Close', 'Volume']
+    if len(prices) > 0:
+        headings = [heading for heading in prices[0] if not heading == 'Date']
+    for heading in headings:
+        values = [row.get(heading, '-') for row in prices]
+        if heading == 'Volume':
+            columns[heading] = numpy_numbers(values, numpy.int64, '0')
+        else:
+            columns[heading] = numpy_numbers(values, numpy.float64, 'nan')
+
+    columns['Dividends'] = {
+        'Date': numpy_dates([row['Date'] for row in dividends]),
+        'Dividend': numpy_numbers([row['Dividend'].split(' ')[0] for row in dividends], numpy.float64, 'nan'),
+    }
+    columns['Splits'] = {
+        'Date': numpy_dates([row['Date'] for row in splits]),
+        'Split': numpy.array([split_ratio(row['Dividend']) for row in splits], dtype=numpy.float64),
+    }
+    return columns
+
+
+def historical_data(url_summary, timezone, from_date, to_date=None, day_range=None, max_workers=None, columnar=False, backend=None):
+    """ Method for getting historical data for stocks/ETFs by specific
+        dates or over a range of dates, from the history backend ('html' or
+        'chart', HISTORY_BACKEND by default). The pages are downloaded
+        concurrently by up to max_workers (HISTORY_WORKERS) threads. With
+        columnar=True the result is returned as numpy columns.
+    """
+    requests = historical_requests(url_summary, timezone, from_date, to_date, day_range, backend)
+
+    historic_chunks = []
+    if len(requests) > 0:
+        with ThreadPoolExecutor(max_workers=min(max_workers or HISTORY_WORKERS, len(requests))) as executor:
+            contents = executor.map(open_page_content, [url for url, parse in requests])
+            historic_chunks = [parse(content) for (url, parse), content in zip(requests, contents)]
+
+    historic_result = combine_historical_chunks(historic_chunks, day_range)
+    if columnar:
+        return historical_columns(historic_result)
     return historic_result
 
 
-class ETF:
-    def __init__(self, ticker):
+def iter_historical_data(url_summary, timezone, from_date, to_date, max_workers=None, backend=None):
+    """ Method for iterating over historical data for a range of dates,
+        yielding the rows of each request of the history backend ('html' or
+        'chart', HISTORY_BACKEND by default) in date order as soon as it is
+        parsed. At most max_workers (HISTORY_WORKERS) requests are downloaded
+        ahead of the consumer.
+    """
+    requests = iter(historical_requests(url_summary, timezone, from_date, to_date, 'range', backend))
+    workers = max_workers or HISTORY_WORKERS
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque((executor.submit(open_page_content, url), parse) for url, parse in islice(requests, workers))
+        previous_keys = set()
+        while len(pending) > 0:
+            future, parse = pending.popleft()
+            content_history = future.result()
+            for url, next_parse in islice(requests, 1):
+                pending.append((executor.submit(open_page_content, url), next_parse))
+
+            historic_rows, previous_keys = ordered_chunk_rows(parse(content_history), previous_keys)
+            for row in historic_rows:
+                yield row
+
+
+async def async_iter_historical_data(url_summary, timezone, from_date, to_date, max_workers=None, backend=None):
+    """ Asyncio counterpart of iter_historical_data.
+    """
+    requests = iter(historical_requests(url_summary, timezone, from_date, to_date, 'range', backend))
+    workers = max_workers or HISTORY_WORKERS
+
+    pending = deque((asyncio.ensure_future(async_open_page_content(url)), parse) for url, parse in islice(requests, workers))
+    previous_keys = set()
+    try:
+        while len(pending) > 0:
+            task, parse = pending.popleft()
+            content_history = await task
+            for url, next_parse in islice(requests, 1):
+                pending.append((asyncio.ensure_future(async_open_page_content(url)), next_parse))
+
+            historic_rows, previous_keys = ordered_chunk_rows(parse(content_history), previous_keys)
+            for row in historic_rows:
+                yield row
+    finally:
+        for task, parse in pending:
+            task.cancel()
+
+
+async def async_historical_data(url_summary, timezone, from_date, to_date=None, day_range=None, columnar=False, backend=None):
+    """ Asyncio counterpart of historical_data, downloading the history
+        pages concurrently.
+    """
+    requests = historical_requests(url_summary, timezone, from_date, to_date, day_range, backend)
+    contents = await asyncio.gather(*[async_open_page_content(url) for url, parse in requests])
+
+    historic_result = combine_historical_chunks([parse(content) for (url, parse), content in zip(requests, contents)], day_range)
+    if columnar:
+        return historical_columns(historic_result)
+    return historic_result
+
+
+class Quote(object):
+    """ Base class for ticker pages which are downloaded and parsed lazily,
+        on first access of their content_* or soup_* attributes.
+    """
+    pages = ()
+    snapshot_fields = {}
+    failed_pages = frozenset()
+
+    def __init_subclass__(cls, **kwargs):
+        super(Quote, cls).__init_subclass__(**kwargs)
+        for name in dir(cls):
+            getter = getattr(cls, name)
+            if name.startswith('get_') and not hasattr(getter, '__wrapped__') and not asyncio.iscoroutinefunction(getter):
+                setattr(cls, name, timed_getter(getter, cls.__name__))
+
+
+    def __getattr__(self, name):
+        return lazy_page_attribute(self, name)
+
+
+    def prepare_page(self, page):
+        """ Method for preparing downloaded content for the getters, decoding
+            the embedded page data or, when the page has none, parsing it.
+        """
+        if not (page in PAGE_DATA_FIELDS and getattr(self, 'data_' + page)):
+            getattr(self, 'soup_' + page)
+
+
+    def prepared_pages(self, pages=None):
+        return [page for page in (pages or self.pages) if not page in self.failed_pages and ('soup_' + page in self.__dict__ or 'data_' + page in self.__dict__)]
+
+
+    def load(self, pages=None, max_workers=None):
+        """ Method for downloading pages concurrently, preparing each page as
+            soon as its content arrives. Pages which failed to download are
+            tried again.
+        """
+        prepared = self.prepared_pages(pages)
+        pages = [page for page in (pages or self.pages) if not page in prepared]
+        if len(pages) == 0:
+            return
+
+        self.retry_pages(pages)
+        with ThreadPoolExecutor(max_workers=max_workers or len(pages)) as executor:
+            futures = {}
+            for page in pages:
+                if 'content_' + page in self.__dict__:
+                    self.prepare_page(page)
+                else:
+                    futures[executor.submit(open_page_content, getattr(self, 'url_' + page))] = page
+
+            for future in as_completed(futures):
+                page = futures[future]
+                content = future.result()
+                if content == None:
+                    self.fail_page(page)
+                else:
+                    self.update_page(page, content)
+                    self.prepare_page(page)
+
+
+    def _embedded_data(self, page, field):
+        """ Method for reading a getter field from the embedded data of a
+            page, returning None when it is missing. Fields are formatted
+            once per page content.
+        """
+        fields = self.__dict__.get('fields_' + page, {})
+        if not field in fields:
+            value = page_data_field(getattr(self, 'data_' + page), page, field)
+            if not 'content_' + page in self.__dict__:
+                return value
+            fields = self.__dict__.setdefault('fields_' + page, {})
+            fields[field] = value
+        return fields[field]
+
+
+    def to_dict(self, pages=None, typed=False):
+        """ Method for taking a snapshot of every field on the given pages
+            as one flat dict, downloading the pages concurrently and reading
+            each field from the page indexes. With typed=True the values are
+            converted by parse_value.
+        """
+        self.load(pages)
+        return self.snapshot(pages, typed)
+
+
+    def snapshot(self, pages=None, typed=False):
+        """ Method for reading every field on the given pages as one flat
+            dict, loading any missing page on access.
+        """
+        snapshot = {'ticker': self.ticker}
+        for page in pages or self.pages:
+            for field in self.snapshot_fields.get(page, ()):
+                # Async quotes wrap the getters, the snapshot reads the loaded pages directly
+                getter = getattr(type(self), 'get_' + field)
+                if asyncio.iscoroutinefunction(getter):
+                    getter = getter.__wrapped__
+                try:
+                    value = getter(self)
+                except PageNotLoaded:
+                    # Async getters load the page and read the snapshot again
+                    raise
+                except (AttributeError, IndexError, TypeError):
+                    value = None
+                snapshot[field] = parse_value(value) if typed else value
+        return snapshot
+
+
+    def record(self, page):
+        """ Method for reading the typed fields of a page into its record.
+        """
+        record_class = PAGE_RECORDS[page]
+        values = self.snapshot([page], typed=True)
+        return record_class(**dict((record_field(field), value) for field, value in values.items()))
+
+
+    # Typed records
+    def get_summary_record(self):
+        return self.record('summary')
+
+    def get_profile_record(self):
+        return self.record('profile')
+
+
+    def history_timezone(self):
+        """ Method for reading the trade timezone of the ticker, once per
+            ticker.
+        """
+        if not self.ticker in ticker_timezones:
+            timezone = self._embedded_data('summary', 'trade_timezone') or historical_timezone(self.index_summary)
+            if timezone == None:
+                return None
+            ticker_timezones[self.ticker] = timezone
+        return ticker_timezones[self.ticker]
+
+
+    def update_page(self, page, content):
+        if not content == None:
+            setattr(self, 'content_' + page, content)
+            self.clear_page(page)
+
+
+    def clear_page(self, page):
+        for prefix in ('data_', 'fields_', 'soup_', 'index_'):
+            self.__dict__.pop(prefix + page, None)
+
+
+    def fail_page(self, page):
+        """ Method for remembering that a page failed to download, so that it
+            is read as an empty page instead of being requested again.
+        """
+        self.failed_pages = self.failed_pages | frozenset([page])
+
+
+    def retry_pages(self, pages=None):
+        """ Method for forgetting that pages failed to download, so that they
+            are downloaded again on their next access.
+        """
+        for page in self.failed_pages.intersection(pages or self.pages):
+            self.failed_pages = self.failed_pages - frozenset([page])
+            self.clear_page(page)
+
+
+    def loaded_pages(self, pages=None):
+        return [page for page in (pages or self.pages) if 'content_' + page in self.__dict__]
+
+
+    # Refresh newest content
+    def refresh(self, pages=None):
+        """ Method for re-reading the loaded pages with conditional requests,
+            re-parsing only the pages whose content changed. Pages which
+            failed to download are downloaded again on their next access.
+        """
+        self.retry_pages(pages)
+        for page in self.loaded_pages(pages):
+            self.update_page(page, changed_page_content(getattr(self, 'url_' + page), self.__dict__['content_' + page]))
+
+
+class ETF(Quote):
+    pages = ('summary', 'profile', 'holdings', 'performance', 'risk')
+
+    # Fields returned by to_dict, read through the get_* method of the same name
+    snapshot_fields = {
+        'summary': (
+            'stock_exchange', 'currency', 'price', 'change', 'percent_change',
+            'previous_trade_time', 'trade_timezone', 'previous_close', 'open', 'bid', 'ask',
+            'day_range', '52_week_range', 'volume', 'avg_daily_volume', 'net_assets', 'nav',
+            'pe_ratio', 'yield', 'ytd_return', 'beta', 'expense_ratio', 'inception_date',
+        ),
+        'profile': (
+            'company_name', 'company_phone', 'fund_overview', 'fund_operations',
+        ),
+        'holdings': (
+            'portfolio_composition', 'sector_weightings', 'equity_holdings', 'bond_ratings',
+            'top_10_holdings',
+        ),
+        'performance': (
+            'trailing_returns_vs_benchmark', 'annual_total_return_history',
+        ),
+        'risk': (
+            'risk_statistics',
+        ),
+    }
+
+    def __init__(self, ticker, prefetch=False):
         self.ticker = ticker
 
-        self.url_summary = "https://finance.yahoo.com/quote/" + self.ticker
+        self.url_summary = BASE_URL + self.ticker
         self.url_profile = self.url_summary + "/profile?p=" + self.ticker
         self.url_holdings = self.url_summary + "/holdings?p=" + self.ticker
         self.url_performance = self.url_summary + "/performance?p=" + self.ticker
         self.url_risk = self.url_summary + "/risk?p=" + self.ticker
 
-        self.content_summary = open_page_content(self.url_summary)
-        self.content_profile = open_page_content(self.url_profile)
-        self.content_holdings = open_page_content(self.url_holdings)
-        self.content_performance = open_page_content(self.url_performance)
-        self.content_risk = open_page_content(self.url_risk)
-
-        self.soup_summary = BeautifulSoup(self.content_summary, 'html.parser')
-        self.soup_profile = BeautifulSoup(self.content_profile, 'html.parser')
-        self.soup_holdings = BeautifulSoup(self.content_holdings, 'html.parser')
-        self.soup_performance = BeautifulSoup(self.content_performance, 'html.parser')
-        self.soup_risk = BeautifulSoup(self.content_risk, 'html.parser')
+        if prefetch:
+            self.load(None if prefetch is True else prefetch)
 
 
     def _profile_data(self, heading):
-        profile_results = {}
-        sections = self.soup_profile.find('div', attrs={'class' : 'W(48%) smartphone_W(100%) Fl(end)'}).find_all('div', attrs={'class' : 'Mb(25px) '})
-        for section in sections:
-            section_heading = search_soup(section, 'h3')
-            section_rows = section.find('div').find_all('div')
-            if heading == section_heading and heading == 'Fund Overview':
-                for row in section_rows:
-                    row_text_start = search_soup(row, 'span', 'class', 'Fl(start)')
-                    row_text_end = search_soup(row, 'span', 'class', 'Fl(end)')
-                    if not row_text_start == None:
-                        profile_results[row_text_start] = row_text_end
-                return profile_results
-                
-            elif heading == section_heading and heading == 'Fund Operations':
-                etf_title = search_soup(section_rows[0], 'span', 'class', 'W(20%)')
-                avg_title = search_soup(section_rows[0], 'span', 'class', 'W(30%)')
-                if etf_title != None and avg_title != None:
-                    for i in range(1, len(section_rows)):
-                        attributes = search_soup(section_rows[i], 'span', 'class', 'W(50%)')
-                        etf_data = search_soup(section_rows[i], 'span', 'class', 'W(20%)')
-                        avg_data = search_soup(section_rows[i], 'span', 'class', 'W(30%)')
-                        if not attributes == None:
-                            profile_results[attributes] = {}
-                            profile_results[attributes][etf_title] = etf_data
-                            profile_results[attributes][avg_title] = avg_data
-                return profile_results
+        return copy.deepcopy(self.index_profile.get(heading))
 
 
     def _holdings_data(self, heading):
-        holdings_results = {}
-        section = self.soup_holdings.find('section', attrs={'class' : 'Pb(20px)'})
-        top_part = section.find_all('div', attrs={'class' : 'W(48%)'})
-        for part in top_part:
-            part_sections = part.find_all('div', attrs={'class' : 'Mb(25px)'})
-            for part_section in part_sections:
-                part_section_title = search_soup(part_section, 'h3')
-                if heading == part_section_title:
-                    start_row = 0
-                    check_section_title = part_section.find('div', attrs={'class' : 'Fz(xs)'})
-                    if check_section_title:
-                        start_row = 1
-                    
-                    part_section_contents = part_section.find('div').find_all('div')
-                    for i in range(start_row, len(part_section_contents)):
-                        span_content = part_section_contents[i].find_all('span')
-                        if len(span_content) > 0:
-                            data_key = search_soup(span_content[0])
-                            data_value = search_soup(span_content[-1])
-                            if not data_key == None:
-                                holdings_results[data_key] = data_value
-
-                    return holdings_results
-        
-        bottom_part = section.find('div', attrs={'data-test' : 'top-holdings'})
-        bottom_title = search_soup(bottom_part, 'span')
-        if heading in bottom_title:
-            table = bottom_part.find('table')
-            table_head_cells = table.find('thead').find_all('th')
-            table_head_list = []
-            for table_head_cell in table_head_cells:
-                table_head_cell_text = search_soup(table_head_cell)
-                table_head_list.append(table_head_cell_text)
-            
-            table_body_rows = table.find('tbody').find_all('tr')
-            for table_body_row in table_body_rows:
-                table_body_row_cells = table_body_row.find_all('td')
-                name = search_soup(table_body_row_cells[0])
-                if not name == None:
-                    holdings_results[name] = {}
-                    for i in range(1, len(table_body_row_cells)):
-                        symbol_asset = search_soup(table_body_row_cells[i])
-                        holdings_results[name][table_head_list[i]] = symbol_asset
-
-            return holdings_results
+        holdings = self.index_holdings
+        if holdings == None:
+            return None
+        if heading in holdings['sections']:
+            return copy.deepcopy(holdings['sections'][heading])
+        if holdings['top_holdings_title'] and heading in holdings['top_holdings_title']:
+            return copy.deepcopy(holdings['top_holdings'])
+        return None
 
-        return
 
     def _performance_data(self, heading):
-        performance_results = {}
-        section = self.soup_performance.find('section', attrs={'class' : 'Pb(20px)'})
-        section_parts = section.find_all('div', attrs={'class' : 'Mb(25px)'})
-        for section_part in section_parts:
-            section_part_title = search_soup(section_part, 'h3')
-            if heading == section_part_title:
-                section_part_list_rows = section_part.find('div').find_all('div')
-                section_part_list_titles = []
-                for section_part_list_row in section_part_list_rows:
-                    if len(section_part_list_titles) == 0:
-                        etf_head = search_soup(section_part_list_row, 'span', 'class', 'W(20%)')
-                        category_head = search_soup(section_part_list_row, 'span', 'class', 'W(30%)')
-                        section_part_list_titles.append(etf_head)
-                        section_part_list_titles.append(category_head)
-                    else:
-                        column_1 = search_soup(section_part_list_row, 'span', 'class', 'W(50%)')
-                        if column_1 == None:
-                            column_1 = search_soup(section_part_list_row, 'span', 'class', 'W(10%)')
-                        column_2 = search_soup(section_part_list_row, 'span', 'class', 'W(20%)')
-                        column_3 = search_soup(section_part_list_row, 'span', 'class', 'W(30%)')
-                        
-                        if not column_1 == None:
-                            performance_results[column_1] = {}
-                            performance_results[column_1][section_part_list_titles[0]] = column_2
-                            performance_results[column_1][section_part_list_titles[1]] = column_3
-
-                return performance_results
-        
-        return
-    
+        if self.index_performance == None:
+            return None
+        return copy.deepcopy(self.index_performance.get(heading))
+
 
     def _risk_data(self):
-        risk_results = {}
-        section = self.soup_risk.find('div', attrs={'class' : 'Miw(650px)'})
-        section_title_row = section.find('div', attrs={'class' : 'Fz(xs)'}).find_all('div', attrs={'class' : 'W(25%)'})
-        title_list = []
-        for cell in section_title_row:
-            year = search_soup(cell, 'span', 'class', 'Ta(c)')
-            current_etf = search_soup(cell, 'span', 'class', 'Fl(start)')
-            category_avg = search_soup(cell, 'span', 'class', 'Fl(end)')
-            title_list.append([year, current_etf, category_avg])
-        
-        section_body_rows = section.find_all('div', attrs={'class' : 'H(25px)'})
-        for section_body_row in section_body_rows:
-            topic = search_soup(section_body_row, 'div', 'class', 'W(24%)')
-            if not topic == None:
-                risk_results[topic] = {}
-
-                body_contents = section_body_row.find_all('div', attrs={'class' : 'W(25%)'})
-                for i in range(len(body_contents)):
-                    etf_data = search_soup(body_contents[i], 'span', 'class', 'W(39%)')
-                    avg_data = search_soup(body_contents[i], 'span', 'class', 'W(57%)')
-                    risk_results[topic][title_list[i][0]] = {}
-                    risk_results[topic][title_list[i][0]][title_list[i][1]] = etf_data
-                    risk_results[topic][title_list[i][0]][title_list[i][2]] = avg_data
-        
-        return risk_results
+        return copy.deepcopy(self.index_risk)
 
 
     # Summary
     def get_stock_exchange(self):
-        return search_soup(self.soup_summary, 'span', 'data-reactid', '9').split(' ')[0]
+        return self._embedded_data('summary', 'stock_exchange') or search_index_word(self.index_summary, 'span', 'data-reactid', '9', 0)
     
     def get_currency(self):
-        return search_soup(self.soup_summary, 'span', 'data-reactid', '9').split(' ')[-1]
+        return self._embedded_data('summary', 'currency') or search_index_word(self.index_summary, 'span', 'data-reactid', '9', -1)
 
     def get_price(self):
-        return search_soup(self.soup_summary, 'span', 'data-reactid', '14')
+        return self._embedded_data('summary', 'price') or search_index(self.index_summary, 'span', 'data-reactid', '14')
     
     def get_change(self):
-        return search_soup(self.soup_summary, 'span', 'data-reactid', '17').split(' ')[0]
+        return self._embedded_data('summary', 'change') or search_index_word(self.index_summary, 'span', 'data-reactid', '17', 0)
     
     def get_percent_change(self):
-        return search_soup(self.soup_summary, 'span', 'data-reactid', '17').split(' ')[1].replace('(', '').replace(')', '')
+        return self._embedded_data('summary', 'percent_change') or search_index_word(self.index_summary, 'span', 'data-reactid', '17', 1, '()')
     
     def get_previous_trade_time(self):
-        return search_soup(self.soup_summary, 'div', 'id', 'quote-market-notice').split(' ')[3]
+        return self._embedded_data('summary', 'previous_trade_time') or search_index_word(self.index_summary, 'div', 'id', 'quote-market-notice', 3)
     
     def get_trade_timezone(self):
-        return search_soup(self.soup_summary, 'div', 'id', 'quote-market-notice').split(' ')[4].replace('.', '')
+        return self._embedded_data('summary', 'trade_timezone') or search_index_word(self.index_summary, 'div', 'id', 'quote-market-notice', 4, '.')
     
     def get_previous_close(self):
-        return search_soup(self.soup_summary, 'td', 'data-test', 'PREV_CLOSE-value')
+        return self._embedded_data('summary', 'previous_close') or search_index(self.index_summary, 'td', 'data-test', 'PREV_CLOSE-value')
     
     def get_open(self):
-        return search_soup(self.soup_summary, 'td', 'data-test', 'OPEN-value')
+        return self._embedded_data('summary', 'open') or search_index(self.index_summary, 'td', 'data-test', 'OPEN-value')
     
     def get_bid(self):
-        return search_soup(self.soup_summary, 'td', 'data-test', 'BID-value')
+        return self._embedded_data('summary', 'bid') or search_index(self.index_summary, 'td', 'data-test', 'BID-value')
     
     def get_ask(self):
-        return search_soup(self.soup_summary, 'td', 'data-test', 'ASK-value')
+        return self._embedded_data('summary', 'ask') or search_index(self.index_summary, 'td', 'data-test', 'ASK-value')
 
     def get_day_range(self):
-        return search_soup(self.soup_summary, 'td', 'data-test', 'DAYS_RANGE-value')
+        return self._embedded_data('summary', 'day_range') or search_index(self.index_summary, 'td', 'data-test', 'DAYS_RANGE-value')
     
     def get_52_week_range(self):
-        return search_soup(self.soup_summary, 'td', 'data-test', 'FIFTY_TWO_WK_RANGE-value')
+        return self._embedded_data('summary', '52_week_range') or search_index(self.index_summary, 'td', 'data-test', 'FIFTY_TWO_WK_RANGE-value')
     
     def get_volume(self):
-        return search_soup(self.soup_summary, 'td', 'data-test', 'TD_VOLUME-value')
+        return self._embedded_data('summary', 'volume') or search_index(self.index_summary, 'td', 'data-test', 'TD_VOLUME-value')
     
     def get_avg_daily_volume(self):
-        return search_soup(self.soup_summary, 'td', 'data-test', 'AVERAGE_VOLUME_3MONTH-value')
+        return self._embedded_data('summary', 'avg_daily_volume') or search_index(self.index_summary, 'td', 'data-test', 'AVERAGE_VOLUME_3MONTH-value')
     
     def get_net_assets(self):
-        return search_soup(self.soup_summary, 'td', 'data-test', 'NET_ASSETS-value')
+        return self._embedded_data('summary', 'net_assets') or search_index(self.index_summary, 'td', 'data-test', 'NET_ASSETS-value')
     
     def get_nav(self):
-        return search_soup(self.soup_summary, 'td', 'data-test', 'NAV-value')
+        return self._embedded_data('summary', 'nav') or search_index(self.index_summary, 'td', 'data-test', 'NAV-value')
     
     def get_pe_ratio(self):
-        return search_soup(self.soup_summary, 'td', 'data-test', 'PE_RATIO-value')
+        return self._embedded_data('summary', 'pe_ratio') or search_index(self.index_summary, 'td', 'data-test', 'PE_RATIO-value')
     
     def get_yield(self):
-        return search_soup(self.soup_summary, 'td', 'data-test', 'TD_YIELD-value')
+        return self._embedded_data('summary', 'yield') or search_index(self.index_summary, 'td', 'data-test', 'TD_YIELD-value')
     
     def get_ytd_return(self):
-        return search_soup(self.soup_summary, 'td', 'data-test', 'YTD_RETURN-value')
+        return self._embedded_data('summary', 'ytd_return') or search_index(self.index_summary, 'td', 'data-test', 'YTD_RETURN-value')
     
     def get_beta(self):
-        return search_soup(self.soup_summary, 'td', 'data-test', 'BETA_3Y-value')
+        return self._embedded_data('summary', 'beta_3y') or search_index(self.index_summary, 'td', 'data-test', 'BETA_3Y-value')
     
     def get_expense_ratio(self):
-        return search_soup(self.soup_summary, 'td', 'data-test', 'EXPENSE_RATIO-value')
+        return self._embedded_data('summary', 'expense_ratio') or search_index(self.index_summary, 'td', 'data-test', 'EXPENSE_RATIO-value')
     
     def get_inception_date(self):
-        return search_soup(self.soup_summary, 'td', 'data-test', 'FUND_INCEPTION_DATE-value')
+        return self._embedded_data('summary', 'inception_date') or search_index(self.index_summary, 'td', 'data-test', 'FUND_INCEPTION_DATE-value')
     
 
     # Profile
     def get_company_name(self):
-        return search_soup(self.soup_profile, 'h3', 'class', 'Mend(40px)')
+        return search_index(self.index_profile, 'h3', 'class', 'Mend(40px)')
     
     def get_company_phone(self):
-        return search_soup(self.soup_profile, 'span', 'class', 'C($c-fuji-blue-1-b)')
+        return search_index(self.index_profile, 'span', 'class', 'C($c-fuji-blue-1-b)')
     
     def get_fund_overview(self):
         return self._profile_data('Fund Overview')
@@ -409,14 +2539,17 @@ class ETF:
     
 
     # Historical data
-    def get_historical_day(self, date):
-        return historical_data(self.url_summary, self.soup_summary, date)
+    def get_historical_day(self, date, columnar=False, backend=None):
+        return historical_data(self.url_summary, self.history_timezone(), date, columnar=columnar, backend=backend)
     
-    def get_historical_days(self, from_date, to_date):
-        return historical_data(self.url_summary, self.soup_summary, from_date, to_date, 'days')
+    def get_historical_days(self, from_date, to_date, columnar=False, backend=None):
+        return historical_data(self.url_summary, self.history_timezone(), from_date, to_date, 'days', columnar=columnar, backend=backend)
     
-    def get_historical_range(self, from_date, to_date):
-        return historical_data(self.url_summary, self.soup_summary, from_date, to_date, 'range')
+    def get_historical_range(self, from_date, to_date, columnar=False, backend=None):
+        return historical_data(self.url_summary, self.history_timezone(), from_date, to_date, 'range', columnar=columnar, backend=backend)
+
+    def iter_historical_range(self, from_date, to_date, backend=None):
+        return iter_historical_data(self.url_summary, self.history_timezone(), from_date, to_date, backend=backend)
     
 
     # Holdings
@@ -449,62 +2582,74 @@ class ETF:
         return self._risk_data()
 
 
-    # Refresh newest content
-    def refresh(self):
-        self.__init__(self.ticker)
-
-
-class Share:
-    def __init__(self, ticker):
+class Share(Quote):
+    pages = ('summary', 'statistics', 'profile', 'analysts')
+
+    # Fields returned by to_dict, read through the get_* method of the same name
+    snapshot_fields = {
+        'summary': (
+            'stock_exchange', 'currency', 'price', 'change', 'percent_change',
+            'previous_trade_time', 'trade_timezone', 'previous_close', 'open', 'bid', 'ask',
+            'day_range', '52_week_range', 'volume', 'avg_daily_volume',
+        ),
+        'statistics': (
+            'market_cap', 'enterprise_value', 'trailing_pe', 'forward_pe', 'peg_ratio',
+            'price_per_sales', 'price_per_book', 'enterprise_value_per_revenue',
+            'enterprise_value_per_ebitda', 'fiscal_year_ends', 'most_recent_quarter',
+            'profit_margin', 'operating_margin', 'return_assets', 'return_equity', 'revenue',
+            'revenue_per_share', 'quarterly_revenue_growth', 'gross_profit', 'ebitda',
+            'net_income_avi_to_common', 'diluted_eps', 'quarterly_earnings_growth', 'total_cash',
+            'total_cash_per_share', 'total_debt', 'total_debt_per_equity', 'current_ratio',
+            'book_value_per_share', 'operating_cash_flow', 'levered_free_cash_flow', 'beta',
+            '52_week_change', 'sp500_52_week_change', '52_week_high', '52_week_low',
+            '50_day_average', '200_day_average', 'avg_3_month_volume', 'avg_10_day_volume',
+            'shares_outstanding', 'float', 'percent_held_insiders', 'percent_held_institutions',
+            'shares_short', 'short_ratio', 'short_percent_of_float', 'shares_short_prior',
+            'forward_dividend_rate', 'forward_dividend_yield', 'trailing_dividend_rate',
+            'trailing_dividend_yield', '5_year_avg_dividend_yield', 'payout_ratio',
+            'dividend_date', 'exdividend_date', 'last_split_factor', 'last_split_date',
+        ),
+        'profile': (
+            'company_name', 'company_address', 'company_phone_number', 'company_website', 'sector',
+            'industry', 'number_of_full_time_employees', 'key_executives',
+        ),
+        'analysts': (
+            'analysts_earnings_estimate', 'analysts_revenue_estimate', 'analysts_earnings_history',
+            'analysts_eps_trend', 'analysts_eps_revisions', 'analysts_growth_estimates',
+        ),
+    }
+
+    def __init__(self, ticker, prefetch=False):
         self.ticker = ticker
 
-        self.url_summary = "https://finance.yahoo.com/quote/" + self.ticker
+        self.url_summary = BASE_URL + self.ticker
         self.url_statistics = self.url_summary + "/key-statistics?p=" + self.ticker
         self.url_profile = self.url_summary + "/profile?p=" + self.ticker
         self.url_analysts = self.url_summary + "/analysts?p=" + self.ticker
 
-        self.content_summary = open_page_content(self.url_summary)
-        self.content_statistics = open_page_content(self.url_statistics)
-        self.content_profile = open_page_content(self.url_profile)
-        self.content_analysts = open_page_content(self.url_analysts)
-
-        self.soup_summary = BeautifulSoup(self.content_summary, 'html.parser')
-        self.soup_statistics = BeautifulSoup(self.content_statistics, 'html.parser')
-        self.soup_profile = BeautifulSoup(self.content_profile, 'html.parser')
-        self.soup_analysts = BeautifulSoup(self.content_analysts, 'html.parser')
+        if prefetch:
+            self.load(None if prefetch is True else prefetch)
 
     
     def _statistics_search(self, heading, search_for=None):
-        table_section = ''
-        head_sections = self.soup_statistics.find_all('h2')
-        for i in range(len(head_sections)):
-            head_section = search_soup(head_sections[i])
-            if heading == head_section:
-                table_section = head_sections[i].find_next_sibling()
-                break
-        
-        statistics_search = {}
-        tables = table_section.find_all('table')
-        for table in tables:
-            table_body = table.find('tbody')
-            table_rows = table_body.find_all('tr')
-            for row in table_rows:
-                cells = row.find_all('td')
-                cell_topic = search_soup(cells[0], 'span')
-                cell_content = search_soup(cells[1])
-                if not cell_topic == None:
-                    if search_for == None:
-                        statistics_search[cell_topic] = cell_content
-                    elif cell_topic == search_for:
-                        return cell_content
-        
         if search_for == None:
-            return statistics_search
-        return None
+            return dict(self.index_statistics.get(heading, {}))
+        if (heading, search_for) in PAGE_DATA_FIELDS['statistics']:
+            value = self._embedded_data('statistics', (heading, search_for))
+            if not value == None:
+                return value
+        return self.index_statistics.get((heading, search_for))
 
 
     def _company_address(self, tag, attribute, value):
-        company_location = self.soup_profile.find(tag, attrs={attribute : value})
+        profile = data_value(self.data_profile, 'assetProfile')
+        if not profile == None and 'address1' in profile:
+            address = ' '.join(part for part in (', '.join(part for part in (profile.get('city'), profile.get('state')) if part), profile.get('zip')) if part)
+            return {'street': profile['address1'], 'address': address, 'country': profile.get('country')}
+
+        company_location = self.index_profile.get((tag, attribute, value))
+        if company_location == None:
+            return None
         
         company_address = {}
         element_counter = 0
@@ -520,7 +2665,19 @@ class Share:
 
     
     def _key_executives(self, tag, attribute, value):
-        table = self.soup_profile.find(tag, attrs={attribute : value})
+        officers = data_value(self.data_profile, 'assetProfile.companyOfficers')
+        if not officers == None:
+            return [{
+                'Name': officer.get('name'),
+                'Title': officer.get('title'),
+                'Pay': data_value(officer, 'totalPay.fmt') or 'N/A',
+                'Exercised': data_value(officer, 'exercisedValue.fmt') or 'N/A',
+                'Year Born': str(officer['yearBorn']) if officer.get('yearBorn') else 'N/A',
+            } for officer in officers]
+
+        table = self.index_profile.get((tag, attribute, value))
+        if table == None:
+            return None
         table_head = table.find('thead').find('tr')
         table_head_row = table_head.find_all('th')
 
@@ -545,78 +2702,54 @@ class Share:
 
     
     def _analysts_search(self, heading):
-        analysts_search_result = {}
-        table_headings = []
-
-        all_tables = self.soup_analysts.find_all('table')
-
-        for table in all_tables:
-            table_head = table.find('thead')
-            table_head_row = table_head.find('tr').find_all('th')
-            table_title = search_soup(table_head_row[0])
-            if heading == table_title:
-                for i in range(1, len(table_head_row)):
-                    table_heading_content = search_soup(table_head_row[i])
-                    table_headings.append(table_heading_content)
-
-                table_body = table.find('tbody').find_all('tr')
-                for table_body_row in table_body:
-                    table_body_row_cell = table_body_row.find_all('td')
-                    table_row_name = search_soup(table_body_row_cell[0])
-                    if not table_row_name == None:
-                        analysts_search_result[table_row_name] = {}
-                        for j in range(1, len(table_body_row_cell)):
-                            table_row_cell = search_soup(table_body_row_cell[j])
-                            analysts_search_result[table_row_name][table_headings[j-1]] = table_row_cell
-
-        return analysts_search_result
+        return copy.deepcopy(self.index_analysts.get(heading, {}))
 
     
     # Summary
     def get_stock_exchange(self):
-        return search_soup(self.soup_summary, 'span', 'data-reactid', '9').split(' ')[0]
+        return self._embedded_data('summary', 'stock_exchange') or search_index_word(self.index_summary, 'span', 'data-reactid', '9', 0)
     
     def get_currency(self):
-        return search_soup(self.soup_summary, 'span', 'data-reactid', '9').split(' ')[-1]
+        return self._embedded_data('summary', 'currency') or search_index_word(self.index_summary, 'span', 'data-reactid', '9', -1)
 
     def get_price(self):
-        return search_soup(self.soup_summary, 'span', 'data-reactid', '14')
+        return self._embedded_data('summary', 'price') or search_index(self.index_summary, 'span', 'data-reactid', '14')
     
     def get_change(self):
-        return search_soup(self.soup_summary, 'span', 'data-reactid', '17').split(' ')[0]
+        return self._embedded_data('summary', 'change') or search_index_word(self.index_summary, 'span', 'data-reactid', '17', 0)
     
     def get_percent_change(self):
-        return search_soup(self.soup_summary, 'span', 'data-reactid', '17').split(' ')[1].replace('(', '').replace(')', '')
+        return self._embedded_data('summary', 'percent_change') or search_index_word(self.index_summary, 'span', 'data-reactid', '17', 1, '()')
     
     def get_previous_trade_time(self):
-        return search_soup(self.soup_summary, 'div', 'id', 'quote-market-notice').split(' ')[3]
+        return self._embedded_data('summary', 'previous_trade_time') or search_index_word(self.index_summary, 'div', 'id', 'quote-market-notice', 3)
     
     def get_trade_timezone(self):
-        return search_soup(self.soup_summary, 'div', 'id', 'quote-market-notice').split(' ')[4].replace('.', '')
+        return self._embedded_data('summary', 'trade_timezone') or search_index_word(self.index_summary, 'div', 'id', 'quote-market-notice', 4, '.')
     
     def get_previous_close(self):
-        return search_soup(self.soup_summary, 'td', 'data-test', 'PREV_CLOSE-value')
+        return self._embedded_data('summary', 'previous_close') or search_index(self.index_summary, 'td', 'data-test', 'PREV_CLOSE-value')
     
     def get_open(self):
-        return search_soup(self.soup_summary, 'td', 'data-test', 'OPEN-value')
+        return self._embedded_data('summary', 'open') or search_index(self.index_summary, 'td', 'data-test', 'OPEN-value')
     
     def get_bid(self):
-        return search_soup(self.soup_summary, 'td', 'data-test', 'BID-value')
+        return self._embedded_data('summary', 'bid') or search_index(self.index_summary, 'td', 'data-test', 'BID-value')
     
     def get_ask(self):
-        return search_soup(self.soup_summary, 'td', 'data-test', 'ASK-value')
+        return self._embedded_data('summary', 'ask') or search_index(self.index_summary, 'td', 'data-test', 'ASK-value')
 
     def get_day_range(self):
-        return search_soup(self.soup_summary, 'td', 'data-test', 'DAYS_RANGE-value')
+        return self._embedded_data('summary', 'day_range') or search_index(self.index_summary, 'td', 'data-test', 'DAYS_RANGE-value')
     
     def get_52_week_range(self):
-        return search_soup(self.soup_summary, 'td', 'data-test', 'FIFTY_TWO_WK_RANGE-value')
+        return self._embedded_data('summary', '52_week_range') or search_index(self.index_summary, 'td', 'data-test', 'FIFTY_TWO_WK_RANGE-value')
     
     def get_volume(self):
-        return search_soup(self.soup_summary, 'td', 'data-test', 'TD_VOLUME-value')
+        return self._embedded_data('summary', 'volume') or search_index(self.index_summary, 'td', 'data-test', 'TD_VOLUME-value')
     
     def get_avg_daily_volume(self):
-        return search_soup(self.soup_summary, 'td', 'data-test', 'AVERAGE_VOLUME_3MONTH-value')
+        return self._embedded_data('summary', 'avg_daily_volume') or search_index(self.index_summary, 'td', 'data-test', 'AVERAGE_VOLUME_3MONTH-value')
     
 
     # Custom Statistics Search
@@ -624,6 +2757,11 @@ class Share:
         return self._statistics_search(heading, row)
 
 
+    # Statistics | Typed record
+    def get_statistics_record(self):
+        return self.record('statistics')
+
+
     # Statistics | Valuation measures
     def get_valuation_measures(self):
         return self._statistics_search('Valuation Measures')
@@ -815,39 +2953,42 @@ class Share:
 
     # Profile | Company information
     def get_company_name(self):
-        return search_soup(self.soup_profile, 'h3', 'class', 'Fz(m)')
+        return self._embedded_data('profile', 'company_name') or search_index(self.index_profile, 'h3', 'class', 'Fz(m)')
     
     def get_company_address(self):
         return self._company_address('p', 'data-reactid', '8')
     
     def get_company_phone_number(self):
-        return search_soup(self.soup_profile, 'a', 'data-reactid', '15')
+        return self._embedded_data('profile', 'company_phone_number') or search_index(self.index_profile, 'a', 'data-reactid', '15')
 
     def get_company_website(self):
-        return search_soup(self.soup_profile, 'a', 'target', '_blank')
+        return self._embedded_data('profile', 'company_website') or search_index(self.index_profile, 'a', 'target', '_blank')
     
     def get_sector(self):
-        return search_soup(self.soup_profile, 'strong', 'data-reactid', '21')
+        return self._embedded_data('profile', 'sector') or search_index(self.index_profile, 'strong', 'data-reactid', '21')
     
     def get_industry(self):
-        return search_soup(self.soup_profile, 'strong', 'data-reactid', '25')
+        return self._embedded_data('profile', 'industry') or search_index(self.index_profile, 'strong', 'data-reactid', '25')
     
     def get_number_of_full_time_employees(self):
-        return search_soup(self.soup_profile, 'strong', 'data-reactid', '29')
+        return self._embedded_data('profile', 'number_of_full_time_employees') or search_index(self.index_profile, 'strong', 'data-reactid', '29')
     
     def get_key_executives(self):
         return self._key_executives('table', 'class', 'W(100%)')
  
     
     # Historical data
-    def get_historical_day(self, date):
-        return historical_data(self.url_summary, self.soup_summary, date)
+    def get_historical_day(self, date, columnar=False, backend=None):
+        return historical_data(self.url_summary, self.history_timezone(), date, columnar=columnar, backend=backend)
     
-    def get_historical_days(self, from_date, to_date):
-        return historical_data(self.url_summary, self.soup_summary, from_date, to_date, 'days')
+    def get_historical_days(self, from_date, to_date, columnar=False, backend=None):
+        return historical_data(self.url_summary, self.history_timezone(), from_date, to_date, 'days', columnar=columnar, backend=backend)
     
-    def get_historical_range(self, from_date, to_date):
-        return historical_data(self.url_summary, self.soup_summary, from_date, to_date, 'range')
+    def get_historical_range(self, from_date, to_date, columnar=False, backend=None):
+        return historical_data(self.url_summary, self.history_timezone(), from_date, to_date, 'range', columnar=columnar, backend=backend)
+
+    def iter_historical_range(self, from_date, to_date, backend=None):
+        return iter_historical_data(self.url_summary, self.history_timezone(), from_date, to_date, backend=backend)
     
 
     # Custom Analysts Search
@@ -875,6 +3016,476 @@ class Share:
         return self._analysts_search('Growth Estimates')
 
 
+# Record attribute names of the fields which are not valid identifiers
+FIELD_ALIASES = {
+    '52_week_range': 'fifty_two_week_range',
+    '52_week_change': 'fifty_two_week_change',
+    '52_week_high': 'fifty_two_week_high',
+    '52_week_low': 'fifty_two_week_low',
+    '50_day_average': 'fifty_day_average',
+    '200_day_average': 'two_hundred_day_average',
+    '5_year_avg_dividend_yield': 'five_year_avg_dividend_yield',
+    'yield': 'fund_yield',
+}
+
+
+def record_field(field):
+    return FIELD_ALIASES.get(field, field)
+
+
+def record_fields(*field_lists):
+    """ Method for merging snapshot field lists into record attribute names.
+    """
+    fields = ['ticker']
+    for field_list in field_lists:
+        for field in field_list:
+            if not record_field(field) in fields:
+                fields.append(record_field(field))
+    return tuple(fields)
+
+
+class Record(object):
+    """ Base class for typed records, keeping the fields in __slots__
+        instead of a per-instance dict.
+    """
+    __slots__ = ()
+
+    def __init__(self, **values):
+        for field in self.__slots__:
+            setattr(self, field, values.get(field))
+
+
+    def to_dict(self):
+        return dict((field, getattr(self, field)) for field in self.__slots__)
+
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.to_dict() == other.to_dict()
+
+
+    def __repr__(self):
+        return '%s(%s)' % (type(self).__name__, ', '.join('%s=%r' % (field, getattr(self, field)) for field in self.__slots__))
+
+
+class SummaryRecord(Record):
+    __slots__ = record_fields(Share.snapshot_fields['summary'], ETF.snapshot_fields['summary'])
+
+
+class StatisticsRecord(Record):
+    __slots__ = record_fields(Share.snapshot_fields['statistics'])
+
+
+class ProfileRecord(Record):
+    __slots__ = record_fields(Share.snapshot_fields['profile'], ETF.snapshot_fields['profile'])
+
+
+PAGE_RECORDS = {'summary': SummaryRecord, 'statistics': StatisticsRecord, 'profile': ProfileRecord}
+
+
+class AdaptiveConcurrency(object):
+    """ AIMD (additive increase, multiplicative decrease) controller of the
+        number of requests in flight. Every healthy request raises the limit
+        by increase / limit, about increase per round of requests. Every
+        connection error, timeout or 429/5xx response, including the ones
+        which are retried, and every request slower than max_latency
+        seconds multiplies it by decrease. Other failures, such as a 404 for
+        an unknown ticker, and pages served by default_cache leave it alone.
+        Requests started before a decrease do not decrease it again. The
+        current limit is read through the limit attribute.
+    """
+
+    def __init__(self, initial=4, minimum=1, maximum=64, increase=1, decrease=0.5, max_latency=2.0):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.increase = increase
+        self.decrease = decrease
+        self.max_latency = max_latency
+
+        self._limit = float(initial)
+        self._in_flight = 0
+        self._epoch = 0
+        self._condition = threading.Condition()
+
+
+    @property
+    def limit(self):
+        return int(self._limit)
+
+
+    @property
+    def in_flight(self):
+        return self._in_flight
+
+
+    def acquire(self):
+        """ Method for waiting until a request may start, returning the
+            token to pass to release.
+        """
+        with self._condition:
+            while self._in_flight >= self.limit:
+                self._condition.wait()
+            self._in_flight += 1
+            return self._epoch
+
+
+    def release(self, token, healthy):
+        """ Method for ending a request, adjusting the limit to whether it
+            was healthy, or not at all when healthy is None.
+        """
+        with self._condition:
+            self._in_flight -= 1
+            if healthy == None:
+                pass
+            elif healthy:
+                self._limit = min(self.maximum, self._limit + float(self.increase) / self.limit)
+            else:
+                self._decrease(token)
+            self._condition.notify_all()
+
+
+    def overload(self, token):
+        """ Method for decreasing the limit on an overload signal of a
+            request which is still in flight.
+        """
+        with self._condition:
+            self._decrease(token)
+
+
+    def _decrease(self, token):
+        if token == self._epoch:
+            self._limit = max(self.minimum, self._limit * self.decrease)
+            self._epoch += 1
+
+
+    def fetch_page(self, url):
+        """ Method for fetching a page within the limit, see fetch_page.
+        """
+        token = self.acquire()
+        started = time.perf_counter()
+        overloads = []
+
+        def observe(response):
+            # Client errors such as a 404 for an unknown ticker say nothing about the server load
+            overloaded = response == None or response.status == 429 or response.status >= 500
+            overloads.append(overloaded)
+            if overloaded:
+                self.overload(token)
+
+        healthy = None
+        try:
+            body = fetch_page(url, observe)
+            healthy = True
+            return body
+        finally:
+            # Cached pages made no request, and overloads have already been counted
+            if len(overloads) == 0 or any(overloads):
+                healthy = None
+            elif time.perf_counter() - started > self.max_latency:
+                healthy = False
+            self.release(token, healthy)
+
+
+def fetch_many(tickers, kind='share', pages=None, max_workers=8, concurrency=None):
+    """ Method for building many Share/ETF objects at once. The pages of all
+        tickers are downloaded through one bounded worker pool, and a
+        BatchResult is yielded for each ticker as soon as it is complete.
+        Failing tickers are reported through BatchResult.error instead of
+        aborting the batch. With an AdaptiveConcurrency as concurrency, the
+        number of requests in flight follows its limit instead of
+        max_workers.
+    """
+    quote_class = {'share': Share, 'etf': ETF}[kind]
+    fetch = fetch_page
+    if not concurrency == None:
+        fetch = concurrency.fetch_page
+        max_workers = concurrency.maximum
+
+    unknown_pages = [page for page in pages or () if not page in quote_class.pages]
+    if len(unknown_pages) > 0:
+        for ticker in tickers:
+            yield BatchResult(ticker, None, ValueError('%s has no %s page' % (quote_class.__name__, ', '.join(unknown_pages))))
+        return
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {}
+        remaining = {}
+        quote_futures = {}
+        for ticker in tickers:
+            quote = quote_class(ticker)
+            quote_pages = pages or quote.pages
+            remaining[id(quote)] = len(quote_pages)
+            quote_futures[id(quote)] = []
+            for page in quote_pages:
+                future = executor.submit(fetch, getattr(quote, 'url_' + page))
+                futures[future] = (quote, page)
+                quote_futures[id(quote)].append(future)
+
+        for future in as_completed(futures):
+            quote, page = futures[future]
+            if not id(quote) in remaining:
+                continue
+
+            try:
+                setattr(quote, 'content_' + page, future.result())
+                quote.prepare_page(page)
+            except Exception as err:
+                del remaining[id(quote)]
+                # Skip the downloads of the failed ticker which have not started yet
+                for pending in quote_futures.pop(id(quote)):
+                    pending.cancel()
+                yield BatchResult(quote.ticker, None, err)
+                continue
+
+            remaining[id(quote)] -= 1
+            if remaining[id(quote)] == 0:
+                del remaining[id(quote)]
+                del quote_futures[id(quote)]
+                yield BatchResult(quote.ticker, quote, None)
+
+
+class PageNotLoaded(AttributeError):
+    """ Raised by async quotes when a getter needs a page which has not
+        been downloaded yet. It is an AttributeError, so hasattr and
+        getattr with a default treat the page attributes as missing.
+    """
+    def __init__(self, page):
+        AttributeError.__init__(self, page)
+        self.page = page
+
+
+def async_getter(getter):
+    """ Method for wrapping a synchronous getter into a coroutine which
+        downloads the pages it needs before reading them.
+    """
+    @functools.wraps(getter)
+    async def wrapper(self, *args, **kwargs):
+        while True:
+            try:
+                return getter(self, *args, **kwargs)
+            except PageNotLoaded as err:
+                # A page which fails to download is marked failed by load, and
+                # is read as an empty page by the next try
+                await self.load([err.page])
+    return wrapper
+
+
+class AsyncQuote(object):
+    """ Mixin turning a Share or ETF into an asyncio client. Construction
+        and getters are awaitable, and the parsing code is shared with the
+        synchronous classes.
+    """
+    def __init__(self, ticker, prefetch=False):
+        super(AsyncQuote, self).__init__(ticker)
+        self.prefetch = prefetch
+
+
+    def __await__(self):
+        return self._construct().__await__()
+
+
+    async def _construct(self):
+        if self.prefetch:
+            await self.load(None if self.prefetch is True else self.prefetch)
+        return self
+
+
+    def __getattr__(self, name):
+        prefix, _, page = name.partition('_')
+        if prefix in PAGE_ATTRIBUTES and page in self.pages and not 'content_' + page in self.__dict__ and not page in self.failed_pages:
+            raise PageNotLoaded(page)
+        return lazy_page_attribute(self, name)
+
+
+    def history_timezone(self):
+        # Without its summary page the history is read in UTC, like Quote
+        try:
+            return super(AsyncQuote, self).history_timezone()
+        except PageNotLoaded:
+            return None
+
+
+    async def load(self, pages=None):
+        """ Method for downloading pages concurrently, parsing each page as
+            soon as its content arrives.
+        """
+        async def load_page(page):
+            if not 'content_' + page in self.__dict__:
+                content = await async_open_page_content(getattr(self, 'url_' + page))
+                if content == None:
+                    self.fail_page(page)
+                    return
+                self.update_page(page, content)
+            self.prepare_page(page)
+
+        prepared = self.prepared_pages(pages)
+        pages = [page for page in (pages or self.pages) if not page in prepared]
+        self.retry_pages(pages)
+        await asyncio.gather(*[load_page(page) for page in pages])
+
+
+    async def to_dict(self, pages=None, typed=False):
+        """ Asyncio counterpart of Quote.to_dict.
+        """
+        await self.load(pages)
+        return self.snapshot(pages, typed)
+
+
     # Refresh newest content
-    def refresh(self):
-        self.__init__(self.ticker)
+    async def refresh(self, pages=None):
+        """ Asyncio counterpart of Quote.refresh, revalidating the loaded
+            pages concurrently.
+        """
+        async def refresh_page(page):
+            content = await async_changed_page_content(getattr(self, 'url_' + page), self.__dict__['content_' + page])
+            self.update_page(page, content)
+
+        self.retry_pages(pages)
+        await asyncio.gather(*[refresh_page(page) for page in self.loaded_pages(pages)])
+
+
+    async def load_timezone(self):
+        if not self.ticker in ticker_timezones:
+            await self.load(['summary'])
+
+
+    # Historical data
+    async def get_historical_day(self, date, columnar=False, backend=None):
+        await self.load_timezone()
+        return await async_historical_data(self.url_summary, self.history_timezone(), date, columnar=columnar, backend=backend)
+
+    async def get_historical_days(self, from_date, to_date, columnar=False, backend=None):
+        await self.load_timezone()
+        return await async_historical_data(self.url_summary, self.history_timezone(), from_date, to_date, 'days', columnar=columnar, backend=backend)
+
+    async def get_historical_range(self, from_date, to_date, columnar=False, backend=None):
+        await self.load_timezone()
+        return await async_historical_data(self.url_summary, self.history_timezone(), from_date, to_date, 'range', columnar=columnar, backend=backend)
+
+    async def iter_historical_range(self, from_date, to_date, backend=None):
+        await self.load_timezone()
+        async for row in async_iter_historical_data(self.url_summary, self.history_timezone(), from_date, to_date, backend=backend):
+            yield row
+
+
+def async_quote_class(quote_class):
+    """ Method for building the asyncio variant of a quote class, wrapping
+        every get_* method which is not already a coroutine.
+    """
+    namespace = {}
+    for name in dir(quote_class):
+        if name.startswith('get_') and not name in AsyncQuote.__dict__:
+            namespace[name] = async_getter(getattr(quote_class, name))
+    return type('Async' + quote_class.__name__, (AsyncQuote, quote_class), namespace)
+
+
+AsyncETF = async_quote_class(ETF)
+AsyncShare = async_quote_class(Share)
+
+
+class PriceStore(object):
+    """ Local SQLite store of daily history rows and dividend/split events,
+        keyed by ticker and ISO date.
+    """
+    price_columns = ('Open', 'High', 'Low', 'Close', 'Adj Close', 'Volume')
+
+    def __init__(self, path='yahoo_fs_prices.sqlite'):
+        self._lock = threading.Lock()
+        self._database = sqlite3.connect(path, check_same_thread=False)
+        self._database.execute('CREATE TABLE IF NOT EXISTS prices (ticker TEXT, date TEXT, open REAL, high REAL, low REAL, close REAL, adj_close REAL, volume INTEGER, PRIMARY KEY (ticker, date))')
+        self._database.execute('CREATE TABLE IF NOT EXISTS events (ticker TEXT, date TEXT, event TEXT, PRIMARY KEY (ticker, date, event))')
+        self._database.commit()
+
+
+    def last_date(self, ticker):
+        """ Method for finding the ISO date of the newest stored row.
+        """
+        with self._lock:
+            return self._database.execute('SELECT MAX(date) FROM prices WHERE ticker = ?', (ticker,)).fetchone()[0]
+
+
+    def row(self, ticker, date):
+        """ Method for reading the stored row of an ISO date.
+        """
+        with self._lock:
+            values = self._database.execute('SELECT open, high, low, close, adj_close, volume FROM prices WHERE ticker = ? AND date = ?', (ticker, date)).fetchone()
+        if values == None:
+            return None
+        return dict(zip(self.price_columns, values))
+
+
+    def append(self, ticker, historic_result):
+        """ Method for storing history rows, replacing rows of the same date.
+        """
+        prices = []
+        events = []
+        for row in historic_result:
+            if 'Dividend' in row:
+                events.append((ticker, iso_date(row['Date']), row['Dividend']))
+            else:
+                values = [None if row.get(column, '-') == '-' else row[column] for column in self.price_columns]
+                prices.append((ticker, iso_date(row['Date'])) + tuple(values))
+
+        with self._lock:
+            self._database.executemany('INSERT OR REPLACE INTO prices VALUES (?, ?, ?, ?, ?, ?, ?, ?)', prices)
+            self._database.executemany('INSERT OR REPLACE INTO events VALUES (?, ?, ?)', events)
+            self._database.commit()
+        return len(prices) + len(events)
+
+
+    def scale_adj_close(self, ticker, factor):
+        """ Method for rescaling every stored Adj Close, e.g. after a new
+            dividend has changed the adjustment of older rows.
+        """
+        with self._lock:
+            self._database.execute('UPDATE prices SET adj_close = adj_close * ? WHERE ticker = ?', (factor, ticker))
+            self._database.commit()
+
+
+    def clear(self, ticker):
+        with self._lock:
+            self._database.execute('DELETE FROM prices WHERE ticker = ?', (ticker,))
+            self._database.execute('DELETE FROM events WHERE ticker = ?', (ticker,))
+            self._database.commit()
+
+
+    def history(self, ticker, from_date=None, to_date=None):
+        """ Method for reading stored rows between two ISO dates, oldest
+            first.
+        """
+        with self._lock:
+            rows = self._database.execute('SELECT date, open, high, low, close, adj_close, volume FROM prices WHERE ticker = ? AND date >= ? AND date <= ? ORDER BY date',
+                                          (ticker, from_date or '0000-00-00', to_date or '9999-99-99')).fetchall()
+        return [dict(zip(('Date',) + self.price_columns, row)) for row in rows]
+
+
+def sync_history(ticker, store, kind='share', from_date='1970-01-01', to_date=None):
+    """ Method for bringing the stored history of a ticker up to date by
+        only requesting the window after the newest stored date. The newest
+        stored row is downloaded again to check that it still matches: a
+        changed Adj Close (new dividend) rescales the stored Adj Close, and
+        a changed Close (new split) replaces the whole stored history.
+        Returns the number of stored rows and events.
+    """
+    quote = {'share': Share, 'etf': ETF}[kind](ticker)
+    to_date = to_date or datetime.today().strftime('%Y-%m-%d')
+
+    last_date = store.last_date(ticker)
+    if last_date == None:
+        return store.append(ticker, quote.get_historical_range(from_date, to_date))
+
+    historic_result = quote.get_historical_range(last_date, to_date)
+    stored_row = store.row(ticker, last_date)
+    for row in historic_result:
+        if 'Dividend' in row or not iso_date(row['Date']) == last_date:
+            continue
+
+        if not stored_row['Close'] == None and not row['Close'] == '-' and not math.isclose(stored_row['Close'], float(row['Close']), rel_tol=1e-6):
+            store.clear(ticker)
+            return store.append(ticker, quote.get_historical_range(from_date, to_date))
+
+        if stored_row['Adj Close'] and not row['Adj Close'] == '-':
+            factor = float(row['Adj Close']) / stored_row['Adj Close']
+            if not math.isclose(factor, 1.0, rel_tol=1e-6):
+                store.scale_adj_close(ticker, factor)
+
+    return store.append(ticker, historic_result)